@@ -0,0 +1,104 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+REJECTION_REASONS = ("body_too_large", "too_many_arguments", "rate_limited", "overloaded")
+
+
+class RateLimiter:
+    """A token bucket per client: ``rate`` requests per second on average, in
+    bursts of up to ``burst``.
+
+    Buckets are kept for the ``max_clients`` most recently seen clients; a
+    client dropped from the table starts again with a full bucket.
+    """
+
+    def __init__(self, rate, burst=None, max_clients=10000):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, client, now=None):
+        """Takes a token from ``client``'s bucket.  Returns 0.0 if there was one,
+        otherwise the seconds until there will be."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [self.burst, now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / self.rate
+
+
+class AdmissionControl:
+    """Decides from the request line and headers alone whether a request is served.
+
+    admit() runs before the body is read: bodies over ``max_body`` bytes get
+    413, clients over their RateLimiter budget (``rate``/``burst`` per client
+    address) 429, and once ``max_in_flight`` admitted requests are unfinished
+    the rest get 503, so an overloaded server sheds load instead of queueing
+    it.  check_arguments() applies ``max_arguments`` to a parsed list.  A
+    limit of 0 is no limit.
+    """
+
+    def __init__(self, max_body=0, max_arguments=0, rate=0.0, burst=None, max_in_flight=0, max_clients=10000):
+        self.max_body = max_body
+        self.max_arguments = max_arguments
+        self.max_in_flight = max_in_flight
+        self.limiter = RateLimiter(rate, burst, max_clients) if rate > 0 else None
+        self.in_flight = 0
+        self.rejected = dict.fromkeys(REJECTION_REASONS, 0)
+        self._lock = threading.Lock()
+
+    def admit(self, client, content_length):
+        """Returns None if the request may proceed, in which case it holds an
+        in-flight slot until release(); otherwise the (status, message,
+        retry_after) to answer with, retry_after in whole seconds or None."""
+        if self.max_body and content_length > self.max_body:
+            self._count("body_too_large")
+            return 413, f"Error: request body of {content_length} bytes exceeds the limit of {self.max_body}", None
+        if self.limiter is not None:
+            wait = self.limiter.acquire(client)
+            if wait:
+                self._count("rate_limited")
+                return 429, "Error: too many requests", max(1, math.ceil(wait))
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.rejected["overloaded"] += 1
+                return 503, "Error: server is overloaded, try again later", 1
+            self.in_flight += 1
+        return None
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def check_arguments(self, count):
+        """The error message if a list of ``count`` arguments is over the limit, else None."""
+        if self.max_arguments and count > self.max_arguments:
+            self._count("too_many_arguments")
+            return f"Error: {count} arguments exceed the limit of {self.max_arguments} per request"
+        return None
+
+    def _count(self, reason):
+        with self._lock:
+            self.rejected[reason] += 1
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": self.in_flight, "rejected": dict(self.rejected),
+                    "clients": 0 if self.limiter is None else len(self.limiter)}
@@ -0,0 +1,112 @@
+import atexit
+import logging
+import threading
+from collections import deque
+
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+class BatchingQueueHandler(logging.Handler):
+    """Hands records to a background thread that writes them to ``targets`` in batches.
+
+    The request thread only snapshots the message and enqueues the record.  The
+    writer thread wakes every ``flush_interval`` seconds, or as soon as
+    ``batch_size`` records are waiting, writes them and flushes each target once
+    per batch.  When the queue is full, ``overflow="block"`` waits for
+    room and ``overflow="drop"`` discards the record and counts it in ``dropped``.
+    """
+
+    def __init__(self, targets, queue_size=10000, overflow="block", batch_size=256, flush_interval=0.05):
+        super().__init__()
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        self.targets = list(targets)
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        # deque.append/popleft are atomic, so the hot path takes no lock; the
+        # writer is only woken early once a full batch is waiting
+        self._records = deque()
+        self._wakeup = threading.Event()
+        self._room = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        # resolve the message now: args may be mutated by the time the writer runs
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            records = self._records
+            if len(records) >= self.queue_size:
+                if self.overflow == "drop":
+                    self.dropped += 1
+                    return
+                with self._room:
+                    self._wakeup.set()
+                    while len(records) >= self.queue_size and not self._closing:
+                        self._room.wait(self.flush_interval)
+            records.append(self.prepare(record))
+            if len(records) >= self.batch_size:
+                self._wakeup.set()
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        while not self._closing:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        records = self._records
+        while records:
+            batch = []
+            while records and len(batch) < self.batch_size:
+                batch.append(records.popleft())
+            self._write(batch)
+            with self._room:
+                self._room.notify_all()
+
+    def _write(self, batch):
+        for target in self.targets:
+            stream = getattr(target, "stream", None)
+            if stream is None:
+                for record in batch:
+                    target.handle(record)
+                continue
+            target.acquire()
+            try:
+                for record in batch:
+                    if record.levelno >= target.level and target.filter(record):
+                        try:
+                            stream.write(target.format(record) + target.terminator)
+                        except Exception:
+                            target.handleError(record)
+                target.flush()
+            finally:
+                target.release()
+
+    def stats(self):
+        return {"queued": len(self._records), "dropped": self.dropped}
+
+    def close(self):
+        if self._thread.is_alive():
+            self._closing = True
+            self._wakeup.set()
+            self._thread.join()
+        for target in self.targets:
+            target.close()
+        atexit.unregister(self.close)
+        super().close()
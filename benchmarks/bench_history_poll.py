@@ -0,0 +1,59 @@
+"""Cost of polling GET /calculator/history while nothing changes: rebuilt, cached, 304.
+
+The request is dispatched in-process through main.AsyncRequest (no sockets,
+loggers off) against a history of ``--entries`` entries.  *rebuilt* has the
+response cache turned off, so every poll reads and serializes the page;
+*cached* serves the bytes built by the first poll; *304* is a client sending
+the ETag it already has.
+
+    python benchmarks/bench_history_poll.py --entries 100000 --limit 1000
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+
+def per_request_us(app, path, headers, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        request = main.AsyncRequest(app, "GET", path, headers, b"")
+        request.dispatch()
+    return (time.perf_counter() - start) / repeat * 1e6, request.status
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    entries = [{"flavor": "INDEPENDENT", "operation": "plus", "arguments": [i, 1], "result": i + 1}
+               for i in range(args.entries)]
+    rebuilt = main.create_app(responses=ResponseCache(max_entries=0))
+    cached = main.create_app()
+    for app in (rebuilt, cached):
+        app.state.call("record", None, 0, entries)
+
+    print(f"{'limit':>8}{'rebuilt us':>12}{'cached us':>11}{'304 us':>9}")
+    for limit in args.limit:
+        path = f"/calculator/history?limit={limit}"
+        slow, _ = per_request_us(rebuilt, path, main._Headers(), args.repeat)
+        fast, _ = per_request_us(cached, path, main._Headers(), args.repeat)
+        etag = main._etag(cached.state.call("version", None, 0)[0])
+        headers = main._Headers({"if-none-match": etag})
+        unchanged, status = per_request_us(cached, path, headers, args.repeat)
+        assert status == 304, status
+        print(f"{limit:>8}{slow:>12.1f}{fast:>11.1f}{unchanged:>9.1f}")
+
+
+if __name__ == "__main__":
+    cli()
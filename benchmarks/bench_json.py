@@ -0,0 +1,64 @@
+"""Response/request serialization cost: stdlib json, orjson (if installed) and the
+byte templates main.py uses for fixed responses and integer results.
+
+    python benchmarks/bench_json.py
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HISTORY = {"result": [{"flavor": "STACK", "operation": "plus", "arguments": [i, i + 1], "result": 2 * i + 1}
+                      for i in range(1000)]}
+CALCULATE_BODY = b'{"operation": "plus", "arguments": [12345, 67890]}'
+PUSH_BODY = json.dumps({"arguments": list(range(1000))}).encode()
+
+
+def _headers_and_body(obj):
+    body = json.dumps(obj).encode()
+    return (f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+CASES = [
+    ("{result: int} response", "json.dumps + headers", lambda: _headers_and_body({"result": 123456})),
+    ("{result: int} response", "int fast path", lambda: main._result_tail(123456)),
+    ("health response", "json.dumps + headers", lambda: _headers_and_body("OK")),
+    ("health response", "precomputed template", lambda: main.HEALTH_RESPONSE),
+    ("history (1000 entries)", "json.dumps", lambda: json.dumps(HISTORY).encode()),
+    ("calculate body", "json.loads", lambda: json.loads(CALCULATE_BODY)),
+    ("push body (1000 ints)", "json.loads", lambda: json.loads(PUSH_BODY)),
+]
+if orjson is not None:
+    main.orjson = orjson  # main only imports it with CALC_JSON=orjson; its loads wrapper needs it
+    CASES[5:5] = [("history (1000 entries)", "orjson.dumps", lambda: orjson.dumps(HISTORY))]
+    CASES += [
+        ("calculate body", "orjson.loads", lambda: main._orjson_loads(CALCULATE_BODY)),
+        ("push body (1000 ints)", "orjson.loads", lambda: main._orjson_loads(PUSH_BODY)),
+    ]
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    if orjson is None:
+        print("orjson is not installed; only the stdlib rows are shown")
+    print(f"{'payload':<26}{'codec':<24}{'us/op':>10}")
+    for payload, codec, func in CASES:
+        best = min(timeit.repeat(func, number=args.number, repeat=5)) / args.number * 1e6
+        print(f"{payload:<26}{codec:<24}{best:>10.2f}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,294 @@
+"""Load generator for the calculator API: throughput and tail latency as JSON.
+
+Starts main.py in-process (``--mode``/``--workers``) or drives a running server
+(``--url http://host:port``).  ``--clients`` threads replay a workload for
+``--duration`` seconds (or until ``--requests`` are sent), each on its own
+connection, kept alive unless ``--no-keep-alive``.
+
+A workload is either a synthetic ``--mix`` (see MIXES) or a ``--workload``
+file with one request per line::
+
+    {"method": "PUT", "path": "/calculator/stack/arguments", "body": {"arguments": [1, 2]}}
+    {"method": "GET", "path": "/calculator/stack/operate?operation=plus", "headers": {"X-Calculator-Session": "a"}}
+
+Every client cycles through the workload from its own offset.  The report
+(stdout, and ``--output``) has requests/s, status counts and p50/p95/p99
+latency overall and per route; ``--baseline`` compares with an earlier report.
+
+    python benchmarks/bench_load.py --mode threaded --mix mixed --clients 16
+    python benchmarks/bench_load.py --url http://localhost:8496 --workload benchmarks/workloads/test_all.jsonl
+"""
+import argparse
+import asyncio
+import contextlib
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (weight, method, path, body)
+MIXES = {
+    "stack": [
+        (1, "PUT", "/calculator/stack/arguments", {"arguments": [7, 3]}),
+        (1, "GET", "/calculator/stack/operate?operation=plus", None),
+        (1, "GET", "/calculator/stack/size", None),
+    ],
+    "independent": [
+        (4, "POST", "/calculator/independent/calculate", {"operation": "plus", "arguments": [123, 456]}),
+        (2, "POST", "/calculator/independent/calculate", {"operation": "times", "arguments": [12345, 67890]}),
+        (1, "POST", "/calculator/independent/calculate", {"operation": "fact", "arguments": [300]}),
+        (1, "POST", "/calculator/independent/batch",
+         [{"operation": "pow", "arguments": [2, n]} for n in range(10)]),
+    ],
+    "history": [
+        (2, "GET", "/calculator/history?limit=50", None),
+        (1, "GET", "/calculator/history?flavor=STACK&limit=50", None),
+        (1, "GET", "/calculator/history?operation=plus&limit=50", None),
+    ],
+}
+MIXES["mixed"] = ([(2 * w, m, p, b) for w, m, p, b in MIXES["stack"]]
+                  + [(w, m, p, b) for w, m, p, b in MIXES["independent"]]
+                  + [(1, "GET", "/calculator/history?limit=20", None), (1, "GET", "/calculator/health", None)])
+
+
+def _from_mix(name):
+    requests = []
+    for weight, method, path, body in MIXES[name]:
+        requests += [(method, path, body, {})] * weight
+    return requests
+
+
+def _from_file(path):
+    requests = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                requests.append((item.get("method", "GET"), item["path"], item.get("body"),
+                                 item.get("headers", {})))
+    if not requests:
+        raise SystemExit(f"{path}: no requests")
+    return requests
+
+
+def _encode(requests, session):
+    encoded = []
+    for method, path, body, headers in requests:
+        headers = dict(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers.setdefault("Content-Type", "application/json")
+        if session:
+            headers.setdefault("X-Calculator-Session", session)
+        encoded.append((method, path, payload, headers, path.partition("?")[0]))
+    return encoded
+
+
+class _Client(threading.Thread):
+    def __init__(self, host, port, requests, offset, keep_alive, deadline, budget, warmup_until):
+        super().__init__(daemon=True)
+        self.host, self.port = host, port
+        self.requests = requests
+        self.offset = offset
+        self.keep_alive = keep_alive
+        self.deadline = deadline
+        self.budget = budget
+        self.warmup_until = warmup_until
+        self.samples = []  # (route, status, seconds); status 0 = transport error
+
+    def run(self):
+        connection = None
+        requests, count = self.requests, len(self.requests)
+        i = self.offset
+        sent = 0
+        while time.perf_counter() < self.deadline and (self.budget is None or sent < self.budget):
+            method, path, payload, headers, route = requests[i % count]
+            i += 1
+            started = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                if not self.keep_alive:
+                    headers = dict(headers, Connection="close")
+                connection.request(method, path, payload, headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if not self.keep_alive or response.will_close:
+                    connection.close()
+                    connection = None
+            except (OSError, http.client.HTTPException):
+                status = 0
+                if connection is not None:
+                    connection.close()
+                connection = None
+            finished = time.perf_counter()
+            if started >= self.warmup_until:
+                self.samples.append((route, status, finished - started))
+                sent += 1
+        if connection is not None:
+            connection.close()
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+    n = len(latencies)
+
+    def rank(p):
+        return round(latencies[min(n - 1, max(0, int(p * n + 0.5) - 1))] * 1000, 3)
+
+    return {"mean": round(sum(latencies) / n * 1000, 3), "p50": rank(0.50), "p95": rank(0.95),
+            "p99": rank(0.99), "max": round(latencies[-1] * 1000, 3)}
+
+
+def run_load(host, port, requests, clients, duration, keep_alive=True, total=None, warmup=0.0,
+             session_per_client=False):
+    """Runs the load and returns the report dict (without the target description)."""
+    started = time.perf_counter()
+    warmup_until = started + warmup
+    deadline = warmup_until + duration
+    budget = None if total is None else -(-total // clients)
+    threads = [_Client(host, port, _encode(requests, f"load-{n}" if session_per_client else None),
+                       n * len(requests) // clients, keep_alive, deadline, budget, warmup_until)
+               for n in range(clients)]
+    for client in threads:
+        client.start()
+    for client in threads:
+        client.join()
+    elapsed = time.perf_counter() - warmup_until
+
+    samples = [sample for client in threads for sample in client.samples]
+    statuses = {}
+    routes = {}
+    for route, status, seconds in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        routes.setdefault(route, []).append(seconds)
+    errors = sum(count for status, count in statuses.items() if status == "0" or status.startswith("5"))
+    return {
+        "clients": clients,
+        "keep_alive": keep_alive,
+        "duration_s": round(elapsed, 3),
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / elapsed, 1) if elapsed > 0 else 0.0,
+        "status": dict(sorted(statuses.items())),
+        "latency_ms": _percentiles([seconds for _, _, seconds in samples]),
+        "routes": {route: {"requests": len(latencies), **_percentiles(latencies)}
+                   for route, latencies in sorted(routes.items())},
+    }
+
+
+class _InProcessServer:
+    """main.py on an ephemeral port in this process, for --mode."""
+
+    def __init__(self, mode, workers):
+        with contextlib.redirect_stdout(sys.stderr):  # keep stdout for the report
+            import main
+
+        self.mode = mode
+        if mode == "asyncio":
+            self.loop = asyncio.new_event_loop()
+            self.server = self.loop.run_until_complete(main.start_async_server(0, "127.0.0.1"))
+            self.port = self.server.sockets[0].getsockname()[1]
+            self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        else:
+            self.server = main.make_server(0, mode, workers, host="127.0.0.1")
+            self.port = self.server.server_address[1]
+            self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.mode == "asyncio":
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+        else:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def _compare(report, baseline):
+    lines = []
+    for label, new, old, better in (
+        ("rps", report["rps"], baseline.get("rps"), "higher"),
+        ("p50 ms", report["latency_ms"].get("p50"), baseline.get("latency_ms", {}).get("p50"), "lower"),
+        ("p95 ms", report["latency_ms"].get("p95"), baseline.get("latency_ms", {}).get("p95"), "lower"),
+        ("p99 ms", report["latency_ms"].get("p99"), baseline.get("latency_ms", {}).get("p99"), "lower"),
+    ):
+        if new is None or not old:
+            continue
+        change = (new - old) / old * 100
+        lines.append(f"{label:<8}{old:>12}{new:>12}{change:>+9.1f}%  ({better} is better)")
+    return lines
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="drive a running server instead of starting one")
+    target.add_argument("--mode", choices=("single", "threaded", "asyncio"), default="threaded",
+                        help="engine of the in-process server")
+    parser.add_argument("--workers", type=int, default=8, help="threads of the in-process threaded server")
+    workload = parser.add_mutually_exclusive_group()
+    workload.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    workload.add_argument("--workload", help="JSON-lines file of recorded requests")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--requests", type=int, help="stop after this many requests in total")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds of load not counted")
+    parser.add_argument("--no-keep-alive", dest="keep_alive", action="store_false",
+                        help="open a new connection for every request")
+    parser.add_argument("--session-per-client", action="store_true",
+                        help="give every client its own X-Calculator-Session")
+    parser.add_argument("--with-logs", action="store_true", help="keep main.py's loggers on (in-process)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against (printed to stderr)")
+    args = parser.parse_args(argv)
+
+    requests = _from_file(args.workload) if args.workload else _from_mix(args.mix)
+    server = None
+    if args.url:
+        url = urlsplit(args.url if "//" in args.url else "http://" + args.url)
+        host, port = url.hostname, url.port or 80
+        target = {"url": args.url}
+    else:
+        if not args.with_logs:
+            logging.disable(logging.CRITICAL)
+        server = _InProcessServer(args.mode, args.workers)
+        if not args.with_logs:
+            sys.modules["main"].SimpleHandler.log_message = lambda *a: None
+        host, port = "127.0.0.1", server.port
+        target = {"mode": args.mode, "workers": args.workers if args.mode == "threaded" else None}
+    try:
+        report = run_load(host, port, requests, args.clients, args.duration, args.keep_alive,
+                          args.requests, args.warmup, args.session_per_client)
+    finally:
+        if server is not None:
+            server.close()
+
+    report = {"target": target, "workload": args.workload or f"mix:{args.mix}", **report}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"{'':<8}{'baseline':>12}{'this run':>12}{'change':>10}", file=sys.stderr)
+        for line in _compare(report, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,129 @@
+"""Request latency with DEBUG enabled on all three loggers: sync vs queued logging.
+
+Runs the server in-process with the log files redirected to a temporary
+directory (and request-logger's console output to /dev/null), sends
+``--requests`` sequential requests over a mix of endpoints and reports the
+client-observed latency for each logging mode.  ``--flush-latency-us`` adds a
+sleep to every log-file flush to stand in for slow storage (a network volume,
+a busy disk); page-cache writes on a local disk are close to free.
+
+    python benchmarks/bench_logging.py --requests 3000 --flush-latency-us 0 500
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+MIX = [
+    ("PUT", "/calculator/stack/arguments", {"arguments": [7, 3]}),
+    ("GET", "/calculator/stack/size", None),
+    ("GET", "/calculator/stack/operate?operation=plus", None),
+    ("POST", "/calculator/independent/calculate", {"operation": "times", "arguments": [123, 456]}),
+    ("DELETE", "/calculator/stack/arguments?count=1", None),
+]
+
+MODES = {
+    "sync": {"mode": "sync"},
+    "async/block": {"mode": "async", "overflow": "block"},
+    "async/drop": {"mode": "async", "overflow": "drop", "queue_size": 1000},
+}
+
+
+class _SlowFlush:
+    """File wrapper whose flush() takes at least ``delay`` seconds."""
+
+    def __init__(self, stream, delay):
+        self._stream = stream
+        self._delay = delay
+
+    def flush(self):
+        self._stream.flush()
+        time.sleep(self._delay)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _encode(method, path, body):
+    payload = json.dumps(body).encode() if body is not None else b""
+    return (f"{method} {path} HTTP/1.0\r\nHost: localhost\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n").encode() + payload
+
+
+def measure(options, requests):
+    main.configure_logging(**options)
+    for logger in main.ALL_LOGGERS.values():
+        logger.setLevel(logging.DEBUG)
+
+    server = main.make_server(0, "single", host="127.0.0.1", app=main.create_app())
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    samples = []
+    try:
+        for i in range(requests):
+            data = _encode(*MIX[i % len(MIX)])
+            start = time.perf_counter()
+            with socket.create_connection(("127.0.0.1", port)) as sock:
+                sock.sendall(data)
+                while sock.recv(65536):
+                    pass
+            samples.append((time.perf_counter() - start) * 1e6)
+    finally:
+        server.shutdown()
+        server.server_close()
+    stats = main.log_queue_stats()
+    dropped = sum(s["dropped"] for s in stats.values())
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[int(len(samples) * 0.99)],
+        "dropped": dropped,
+    }
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--flush-latency-us", type=float, nargs="+", default=[0, 500])
+    args = parser.parse_args(argv)
+
+    main.SimpleHandler.log_message = lambda *a: None
+    devnull = open(os.devnull, "w")
+    real_stdout = sys.stdout
+    real_open = logging.FileHandler._open
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        main.LOG_DIR = log_dir
+        for latency in args.flush_latency_us:
+            if latency:
+                logging.FileHandler._open = lambda self: _SlowFlush(real_open(self), latency / 1e6)
+            else:
+                logging.FileHandler._open = real_open
+            for name, options in MODES.items():
+                sys.stdout = devnull
+                try:
+                    results.append((latency, name, measure(options, args.requests)))
+                finally:
+                    sys.stdout = real_stdout
+        logging.FileHandler._open = real_open
+        main.configure_logging(mode="sync")
+
+    print(f"{'flush us':>8}  {'logging':<14}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'dropped':>9}")
+    for latency, name, r in results:
+        print(f"{latency:>8.0f}  {name:<14}{r['mean_us']:>10.0f}{r['p50_us']:>10.0f}"
+              f"{r['p99_us']:>10.0f}{r['dropped']:>9}")
+
+
+if __name__ == "__main__":
+    cli()
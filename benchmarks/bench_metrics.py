@@ -0,0 +1,39 @@
+"""Per-request cost of recording metrics (begin + observe) and of rendering /metrics.
+
+    python benchmarks/bench_metrics.py
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import RequestMetrics  # noqa: E402
+
+ROUTES = ["/calculator/stack/size", "/calculator/stack/operate", "/calculator/history",
+          "/calculator/independent/calculate", "/calculator/health"]
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    metrics = RequestMetrics()
+    for route in ROUTES:
+        metrics.begin()
+        metrics.observe(route, "GET", 200, 0.0004)
+
+    def record():
+        metrics.begin()
+        metrics.observe("/calculator/stack/size", "GET", 200, 0.0004)
+
+    per_request = min(timeit.repeat(record, number=args.number, repeat=5)) / args.number * 1e6
+    render = min(timeit.repeat(metrics.render, number=1000, repeat=3)) / 1000 * 1e6
+    print(f"record one request: {per_request:8.3f} us")
+    print(f"render /metrics:    {render:8.1f} us ({len(ROUTES)} routes)")
+
+
+if __name__ == "__main__":
+    cli()
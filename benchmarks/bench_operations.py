@@ -0,0 +1,92 @@
+"""Operation dispatch: the old OPERATIONS dict against operations.Registry.
+
+"before" replays what main.py did per operation: ``name.lower()`` and a dict
+lookup in the handler for GET /calculator/stack/operate, then again in
+perform_operation together with the arity checks, int() of every argument and
+the per-operation if-checks, even for values popped off the stack.  "after"
+is Registry.perform() for client arguments (independent) and get() plus
+Operation.apply() for stack values.  Both call the function directly, so the
+ComputeEngine, which is the same either way, is left out.
+
+Only the stack path is faster: it skips the lookup and int() the old code
+repeated.  The independent path does the same work as before, a lookup, the
+arity checks and one conversion per argument, and times within noise of it.
+
+    python benchmarks/bench_operations.py --number 200000
+"""
+import argparse
+import operator
+import os
+import sys
+import timeit
+from math import factorial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from operations import OPERATIONS  # noqa: E402
+
+LEGACY_OPERATIONS = {
+    "plus": (2, operator.add),
+    "minus": (2, operator.sub),
+    "times": (2, operator.mul),
+    "divide": (2, operator.floordiv),
+    "pow": (2, pow),
+    "abs": (1, abs),
+    "fact": (1, factorial),
+}
+
+
+def legacy_perform(name, args):
+    op = name.lower()
+    if op not in LEGACY_OPERATIONS:
+        return None, f"Error: unknown operation: {name}", 409
+    expected, func = LEGACY_OPERATIONS[op]
+    if len(args) < expected:
+        return None, f"Error: Not enough arguments to perform the operation {name}", 409
+    if len(args) > expected:
+        return None, f"Error: Too many arguments to perform the operation {name}", 409
+    try:
+        args = [int(arg) for arg in args]
+    except ValueError:
+        return None, "Error: Arguments must be numeric (integers)", 409
+    if op == "divide" and args[1] == 0:
+        return None, "Error while performing operation Divide: division by 0", 409
+    if op == "fact" and args[0] < 0:
+        return None, "Error while performing operation Factorial: not supported for the negative number", 409
+    try:
+        return LEGACY_OPERATIONS[op][1](*args), None, 200
+    except Exception as exc:
+        return None, f"Error while performing operation {name}: {str(exc)}", 409
+
+
+def legacy_stack(name, args):
+    if not name or name.lower() not in LEGACY_OPERATIONS:
+        return None
+    LEGACY_OPERATIONS[name.lower()][0]
+    return legacy_perform(name, args)
+
+
+def registry_stack(name, args):
+    operation = OPERATIONS.get(name)
+    if operation is None:
+        return None
+    return operation.apply(args, None, name)
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    print(f"{'case':<26}{'before ns':>11}{'after ns':>10}")
+    for operation, operands in (("plus", [3, 4]), ("divide", [7, 2]), ("fact", [5]), ("Times", [6, 7])):
+        for kind, before, after in (("independent", legacy_perform, OPERATIONS.perform),
+                                    ("stack", legacy_stack, registry_stack)):
+            assert before(operation, operands)[0] == after(operation, operands)[0]
+            timings = [min(timeit.repeat(lambda: func(operation, operands), number=args.number, repeat=5))
+                       / args.number * 1e9 for func in (before, after)]
+            print(f"{kind + ' ' + operation:<26}{timings[0]:>11.0f}{timings[1]:>10.0f}")
+
+
+if __name__ == "__main__":
+    cli()
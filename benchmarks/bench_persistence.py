@@ -0,0 +1,116 @@
+"""Write-ahead log cost per fsync policy, and restart time from log replay vs snapshot.
+
+    python benchmarks/bench_persistence.py --entries 10000000
+
+Throughput: ``--threads`` clients append one record each per request under a
+shared lock (as the handlers do under the session lock) and then wait for commit().
+Recovery: ``--entries`` history entries are logged in batches, then restored
+once by replaying the whole log and once from a snapshot of the same state.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from persistence import FSYNC_POLICIES, Persistence  # noqa: E402
+
+BATCH = 1000
+
+
+def _entry(i):
+    return {"flavor": "INDEPENDENT", "operation": "plus", "arguments": [i, i + 1], "result": 2 * i + 1}
+
+
+def _throughput(directory, fsync, threads, seconds, interval_ms):
+    store = None
+    if fsync is not None:
+        store = Persistence(directory, fsync, interval_ms, snapshot_every=10 ** 12)
+        store.recover()
+    lock = threading.Lock()
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def client(slot):
+        record = [0, "push", [12345]]
+        while time.perf_counter() < deadline:
+            with lock:
+                ticket = store.append(record) if store else 0
+            if store:
+                store.commit(ticket)
+            counts[slot] += 1
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if store:
+        store.close()
+    return sum(counts) / seconds
+
+
+def _restore(directory):
+    app = main.create_app()
+    started = time.perf_counter()
+    replayed = app.enable_persistence(directory, "none", snapshot_every=10 ** 12)
+    elapsed = time.perf_counter() - started
+    assert len(app.history) == app.state.request_count() * BATCH, "history was not fully restored"
+    return app, elapsed, replayed
+
+
+def _recovery(directory, entries):
+    store = Persistence(directory, "none", snapshot_every=10 ** 12)
+    store.recover()
+    for num in range(1, entries // BATCH + 1):
+        base = (num - 1) * BATCH
+        store.append([num, "history", [_entry(base + i) for i in range(BATCH)]])
+    store.close()
+    log_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+    app, replay_time, replayed = _restore(directory)
+    with app.default_session.lock:
+        app.persistence.snapshot(app.state.request_count(), app.stack, app.history)
+    app.close()
+    while app.persistence._snapshotting is not None:
+        time.sleep(0.05)
+    app, snapshot_time, _ = _restore(directory)
+    app.close()
+    return log_bytes, replayed, replay_time, snapshot_time
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--interval-ms", type=float, default=50)
+    parser.add_argument("--entries", type=int, default=10_000_000)
+    args = parser.parse_args(argv)
+
+    print(f"{'fsync':<12}{'records/s':>12}")
+    for fsync in (None, *FSYNC_POLICIES):
+        directory = tempfile.mkdtemp(prefix="calc-wal-")
+        try:
+            rate = _throughput(directory, fsync, args.threads, args.seconds, args.interval_ms)
+        finally:
+            shutil.rmtree(directory)
+        print(f"{fsync or 'disabled':<12}{rate:>12.0f}")
+
+    directory = tempfile.mkdtemp(prefix="calc-wal-")
+    try:
+        log_bytes, replayed, replay_time, snapshot_time = _recovery(directory, args.entries)
+    finally:
+        shutil.rmtree(directory)
+    print(f"\nrecovery of {args.entries} history entries ({log_bytes / 2 ** 20:.0f} MiB of log, "
+          f"{replayed} records)")
+    print(f"  log replay: {replay_time:8.2f}s")
+    print(f"  snapshot:   {snapshot_time:8.2f}s")
+
+
+if __name__ == "__main__":
+    cli()
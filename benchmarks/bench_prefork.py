@@ -0,0 +1,92 @@
+"""Throughput of --mode prefork as the number of worker processes grows.
+
+Starts ``main.py --mode prefork --processes N`` for every N in ``--processes``
+(default 1, 2, 4, ... up to the CPU count), turns its loggers down to ERROR and
+drives it with bench_load's clients.  Independent calculations run in the
+workers and should scale with the cores; stack requests are all applied by
+the one coordinator process, so the ``stack`` mix levels off once it is busy.
+
+    python benchmarks/bench_prefork.py --mix independent --clients 32
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_load import MIXES, _from_mix, run_load  # noqa: E402
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(port, method, path):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request(method, path)
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def _start(processes):
+    port = _free_port()
+    server = subprocess.Popen([sys.executable, MAIN, "--mode", "prefork", "--processes", str(processes),
+                               "--port", str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            if _request(port, "GET", "/calculator/health") == 200:
+                break
+        except OSError:
+            pass
+        if time.monotonic() > deadline or server.poll() is not None:
+            server.kill()
+            raise SystemExit(f"prefork server with {processes} processes did not start")
+        time.sleep(0.1)
+    for name in ("request-logger", "stack-logger", "independent-logger"):
+        _request(port, "PUT", f"/logs/level?logger-name={name}&logger-level=ERROR")
+    return server, port
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cores = os.cpu_count() or 1
+    default = sorted({1, cores} | {2 ** n for n in range(cores.bit_length()) if 2 ** n <= cores})
+    parser.add_argument("--processes", type=int, nargs="+", default=default)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="independent")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    requests = _from_mix(args.mix)
+    print(f"mix {args.mix}, {args.clients} clients, {cores} CPU(s)")
+    print(f"{'processes':>10}{'requests/s':>12}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'speedup':>9}")
+    base = None
+    for processes in args.processes:
+        server, port = _start(processes)
+        try:
+            # SimpleHandler answers one request per connection
+            report = run_load("127.0.0.1", port, requests, args.clients, args.duration, keep_alive=False,
+                              warmup=args.warmup)
+        finally:
+            server.terminate()
+            server.wait()
+        base = base or report["rps"]
+        print(f"{processes:>10}{report['rps']:>12.0f}{report['latency_ms'].get('p50', 0):>9.2f}"
+              f"{report['latency_ms'].get('p99', 0):>9.2f}{report['errors']:>8}"
+              f"{report['rps'] / base if base else 0:>8.2f}x")
+
+
+if __name__ == "__main__":
+    cli()
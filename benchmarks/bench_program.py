@@ -0,0 +1,46 @@
+"""RPN programs: compiling vs a ProgramCache hit, and running the compiled form.
+
+    python benchmarks/bench_program.py --length 1000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from rpn import ProgramCache, compile_program, run_program  # noqa: E402
+
+
+def _program(length):
+    """1, then (value, "plus") pairs until ``length`` tokens."""
+    tokens = [1]
+    while len(tokens) + 2 <= length:
+        tokens += [len(tokens), "plus"]
+    return tokens
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--length", type=int, default=1000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    tokens = _program(args.length)
+    cache = ProgramCache(main.OPERATIONS)
+    cache.get(tokens)
+    program = compile_program(tokens, main.OPERATIONS)
+    cases = [
+        ("compile", lambda: compile_program(tokens, main.OPERATIONS)),
+        ("cache hit", lambda: cache.get(list(tokens))),
+        ("run", lambda: run_program(program, [], main.perform_on_ints)),
+    ]
+    print(f"program of {len(tokens)} tokens ({program.steps} operations)")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=args.number, repeat=5)) / args.number * 1e6
+        print(f"{name:<12}{best:>10.1f} us")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,90 @@
+"""Per-request dispatch cost: the old if-chains against main.resolve_route().
+
+"before" replays what the _do_*_impl methods used to do to pick a branch:
+urlparse + parse_qs on every request, then a chain of ``path ==`` checks (and
+``startswith`` for PUT /logs/level).  "after" is resolve_route() followed by
+reading the one query parameter the handler needs, so the query is only
+parsed where it is actually used.
+
+    python benchmarks/bench_router.py
+"""
+import argparse
+import os
+import sys
+import timeit
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+TARGETS = [
+    ("GET", "/calculator/health", None),
+    ("GET", "/calculator/stack/size", None),
+    ("GET", "/calculator/stack/operate?operation=plus", "operation"),
+    ("GET", "/calculator/history?flavor=STACK", "flavor"),
+    ("GET", "/logs/level?logger-name=stack-logger", "logger-name"),
+    ("POST", "/calculator/independent/calculate", None),
+    ("PUT", "/calculator/stack/arguments", None),
+    ("PUT", "/logs/level?logger-name=stack-logger&logger-level=DEBUG", "logger-name"),
+    ("DELETE", "/calculator/stack/arguments?count=2", "count"),
+    ("GET", "/does/not/exist", None),
+]
+
+_GET_CHAIN = ("/calculator/health", "/calculator/stack/size", "/calculator/stack/operate",
+              "/calculator/history", "/logs/level")
+
+
+def legacy_dispatch(command, target, param):
+    if command == "GET":
+        parsed = urlparse(target)
+        qs = parse_qs(parsed.query)
+        for candidate in _GET_CHAIN:
+            if parsed.path == candidate:
+                return candidate, qs.get(param, [None])[0] if param else None
+        return None, None
+    if command == "POST":
+        return (target if target == "/calculator/independent/calculate" else None), None
+    if command == "PUT":
+        if target == "/calculator/stack/arguments":
+            return target, None
+        if target.startswith("/logs/level"):
+            qs = parse_qs(urlparse(target).query)
+            return "/logs/level", qs.get(param, [None])[0]
+        return None, None
+    if command == "DELETE":
+        parsed = urlparse(target)
+        if parsed.path != "/calculator/stack/arguments":
+            return None, None
+        return parsed.path, parse_qs(parsed.query).get(param, [None])[0]
+    return None, None
+
+
+def router_dispatch(command, target, param):
+    handler, raw_query = main.resolve_route(command, target)
+    value = parse_qs(raw_query).get(param, [None])[0] if param and raw_query else None
+    return handler, value
+
+
+def bench(func, number):
+    def loop():
+        for command, target, param in TARGETS:
+            func(command, target, param)
+    best = min(timeit.repeat(loop, number=number, repeat=5))
+    return best / (number * len(TARGETS)) * 1e9
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    before = bench(legacy_dispatch, args.number)
+    after = bench(router_dispatch, args.number)
+    print(f"if-chain + urlparse : {before:8.0f} ns/request")
+    print(f"resolve_route       : {after:8.0f} ns/request")
+    print(f"speed-up            : {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,86 @@
+"""Stack throughput with every client on the default stack vs one session per client.
+
+Runs the threaded server in-process.  Each of ``--clients`` keep-alive clients
+repeatedly pushes an operand and runs ``fact`` on it.  The engine sends every
+operation to its process pool, so the time is spent waiting with the session
+lock held: on one shared stack the clients queue behind each other, with a
+session each they only wait for their own operations (given a core per pool
+worker).
+
+    python benchmarks/bench_sessions.py --clients 8
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+PUSH_BODY = json.dumps({"arguments": [1400]})
+
+
+def _client(port, session, deadline, counts, slot):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json"}
+    if session:
+        headers[main.SESSION_HEADER] = session
+    while time.perf_counter() < deadline:
+        connection.request("PUT", "/calculator/stack/arguments", PUSH_BODY, headers)
+        connection.getresponse().read()
+        connection.request("GET", "/calculator/stack/operate?operation=fact", headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status == 200:
+            counts[slot] += 1
+    connection.close()
+
+
+def _measure(clients, workers, duration, sessions):
+    server = main.make_server(0, "threaded", workers, "127.0.0.1")
+    port = server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    counts = [0] * clients
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=_client, args=(port, f"client-{i}" if sessions else None,
+                                                      deadline, counts, i))
+               for i in range(clients)]
+    for client in threads:
+        client.start()
+    for client in threads:
+        client.join()
+    server.shutdown()
+    server.server_close()
+    return sum(counts) / duration
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    main.SimpleHandler.log_message = lambda *a: None
+    main.ENGINE.pool_size = args.pool_size
+    main.ENGINE.offload_min_digits = 1
+    main.ENGINE.cache.max_entries = 0
+    try:
+        print(f"{'stacks':<18}{'operations/s':>14}")
+        for label, sessions in (("shared (default)", False), ("one per client", True)):
+            rate = _measure(args.clients, args.workers, args.duration, sessions)
+            print(f"{label:<18}{rate:>14.0f}")
+    finally:
+        main.ENGINE.shutdown()
+
+
+if __name__ == "__main__":
+    cli()
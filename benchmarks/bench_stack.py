@@ -0,0 +1,72 @@
+"""Stack storage: the old list of JSON values vs stack_store.IntStack.
+
+    python benchmarks/bench_stack.py --size 1000000
+
+Reports bulk push time (from the decoded JSON body), DELETE ?count=size time
+and bytes per element left allocated once the request is done.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stack_store import IntStack  # noqa: E402
+
+
+def _list_push(values):
+    stack = []
+    stack.extend(values)
+    return stack
+
+
+def _list_remove(stack, count):
+    for _ in range(count):
+        stack.pop()
+
+
+def _intstack_push(values):
+    stack = IntStack()
+    stack.extend(IntStack.convert(values))
+    return stack
+
+
+def _intstack_remove(stack, count):
+    stack.truncate(count)
+
+
+def _measure(push, remove, body, size):
+    values = json.loads(body)["arguments"]
+    started = time.perf_counter()
+    stack = push(values)
+    push_time = time.perf_counter() - started
+    started = time.perf_counter()
+    remove(stack, size)
+    remove_time = time.perf_counter() - started
+    del stack, values
+
+    tracemalloc.start()
+    stack = push(json.loads(body)["arguments"])
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return push_time, remove_time, held / size
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+    body = json.dumps({"arguments": list(range(1000, 1000 + args.size))})
+
+    print(f"{'stack':<10}{'push ms':>10}{'delete ms':>11}{'bytes/elem':>12}")
+    for name, push, remove in (("list", _list_push, _list_remove),
+                               ("IntStack", _intstack_push, _intstack_remove)):
+        push_time, remove_time, per_element = _measure(push, remove, body, args.size)
+        print(f"{name:<10}{push_time * 1000:>10.1f}{remove_time * 1000:>11.2f}{per_element:>12.1f}")
+
+
+if __name__ == "__main__":
+    cli()
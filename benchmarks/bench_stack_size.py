@@ -0,0 +1,60 @@
+"""Cost of GET /calculator/stack/size as the stack grows, per stack-logger level.
+
+The request is dispatched in-process through main.AsyncRequest (no sockets),
+with the log files in a temporary directory.  At INFO the stack dump in the
+DEBUG line is never built, so the cost should stay flat; the DEBUG column shows
+what every size query used to pay regardless of level.
+
+    python benchmarks/bench_stack_size.py --sizes 10 1000 100000 1000000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def per_request_us(app, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        main.AsyncRequest(app, "GET", "/calculator/stack/size", main._Headers(), b"").dispatch()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    app = main.create_app()
+    real_stdout = sys.stdout
+    rows = []
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull:
+        main.LOG_DIR = log_dir
+        sys.stdout = devnull
+        try:
+            for size in args.sizes:
+                app.stack.clear()
+                app.stack.extend(list(range(size)))
+                row = [size]
+                for level in (logging.INFO, logging.DEBUG):
+                    main.STACK_LOGGER.setLevel(level)
+                    row.append(per_request_us(app, args.repeat))
+                rows.append(row)
+        finally:
+            sys.stdout = real_stdout
+            main.STACK_LOGGER.setLevel(logging.INFO)
+
+    print(f"{'stack size':>12}{'INFO us':>12}{'DEBUG us':>14}")
+    for size, info, debug in rows:
+        print(f"{size:>12}{info:>12.1f}{debug:>14.1f}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,98 @@
+"""Cold start of main.py: import time, time until listening and time to the first response.
+
+Starts ``python -m main --mode M`` (as the image does) on a free port ``--runs``
+times per mode and polls the port every millisecond, timing from just before
+the spawn: *listening* is the first accepted connection, *first response* the
+end of the first GET /calculator/health (which also opens the log files).  *import* is
+``python -c "import main"`` less a bare interpreter start, and *create_app* the
+cost of one more App in a warm process.  The goal is a first response within
+100 ms; compile the bytecode first (``python -m compileall .``, as the image
+does), or with PYTHONDONTWRITEBYTECODE set every start recompiles the sources.
+
+    python benchmarks/bench_startup.py --modes single threaded asyncio --runs 10
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOAL_MS = 100
+HEALTH = b"GET /calculator/health HTTP/1.0\r\nHost: localhost\r\n\r\n"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _spawn_ms(code):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def _start_once(mode, processes, timeout=30.0):
+    """(ms until listening, ms until the first response) of one fresh server."""
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "main", "--mode", mode, "--processes", str(processes),
+                               "--port", str(port)], cwd=ROOT, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    listening = None
+    try:
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=timeout) as sock:
+                    if listening is None:
+                        listening = time.perf_counter() - started
+                    sock.sendall(HEALTH)
+                    reply = b""
+                    while chunk := sock.recv(65536):
+                        reply += chunk
+                if reply.startswith(b"HTTP/1.1 200") or reply.startswith(b"HTTP/1.0 200"):
+                    return listening * 1000, (time.perf_counter() - started) * 1000
+            except OSError:
+                pass
+            if time.perf_counter() - started > timeout or server.poll() is not None:
+                raise SystemExit(f"{mode} server did not answer within {timeout:g}s")
+            time.sleep(0.001)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["single", "threaded", "asyncio", "prefork"],
+                        choices=["single", "threaded", "asyncio", "prefork"])
+    parser.add_argument("--processes", type=int, default=2, help="worker processes for prefork")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    bare = statistics.median(_spawn_ms("pass") for _ in range(args.runs))
+    imported = statistics.median(_spawn_ms("import main") for _ in range(args.runs))
+    sys.path.insert(0, ROOT)
+    import main
+
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        main.create_app()
+    app_ms = (time.perf_counter() - started) / args.runs * 1000
+    print(f"interpreter {bare:.1f} ms, import main +{imported - bare:.1f} ms, create_app {app_ms:.2f} ms")
+
+    print(f"{'mode':<10}{'listening ms':>14}{'first response ms':>19}{'max ms':>9}  goal {GOAL_MS} ms")
+    for mode in args.modes:
+        runs = [_start_once(mode, args.processes) for _ in range(args.runs)]
+        first = [response for _, response in runs]
+        median = statistics.median(first)
+        print(f"{mode:<10}{statistics.median(listening for listening, _ in runs):>14.1f}{median:>19.1f}"
+              f"{max(first):>9.1f}  {'met' if median < GOAL_MS else 'missed'}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,62 @@
+"""Peak memory and time to first byte of GET /calculator/history, buffered vs streamed.
+
+Fills the history with ``--entries`` entries and serves the whole history
+in-process through AsyncRequest: once built as a single body (STREAM_PAGE
+larger than the history) and once streamed ``--page`` entries at a time.
+
+    python benchmarks/bench_stream.py --entries 1000000
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def _serve(app, page_size):
+    main.STREAM_PAGE = page_size
+    tracemalloc.start()
+    started = time.perf_counter()
+    request = main.AsyncRequest(app, "GET", "/calculator/history", main._Headers(), b"")
+    request.dispatch()
+    size = 0
+    first_byte = None
+    if request.chunks is None:
+        size = len(request.render(False))
+        first_byte = time.perf_counter() - started
+    else:
+        for chunk in request.chunks:
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, first_byte, total, peak
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    app = main.create_app()
+    app.history.extend({"flavor": "INDEPENDENT", "operation": "plus", "arguments": [i, 1], "result": i + 1}
+                        for i in range(args.entries))
+
+    print(f"{'response':<10}{'MiB sent':>10}{'first byte ms':>15}{'total ms':>10}{'peak MiB':>10}")
+    for label, page_size in (("buffered", args.entries + 1), ("streamed", args.page)):
+        size, first_byte, total, peak = _serve(app, page_size)
+        print(f"{label:<10}{size / 2 ** 20:>10.1f}{first_byte * 1000:>15.1f}{total * 1000:>10.1f}"
+              f"{peak / 2 ** 20:>10.1f}")
+
+
+if __name__ == "__main__":
+    cli()
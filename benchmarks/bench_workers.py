@@ -0,0 +1,136 @@
+"""Throughput of main.py per serving mode / worker count on a mix of endpoints.
+
+Starts the server in-process on a free port for every configuration and runs
+``--clients`` concurrent clients cycling through a mix of stack, independent and
+health calls for ``--duration`` seconds.  Alongside them ``--slow-clients``
+upload a padded ``/calculator/independent/calculate`` body in small chunks with
+a pause between chunks (a slow network link).  A single-threaded server sits on
+those uploads while every other client waits; a worker pool keeps serving.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 16
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+MIX = [
+    ("PUT", "/calculator/stack/arguments", {"arguments": [7, 3]}),
+    ("GET", "/calculator/stack/size", None),
+    ("GET", "/calculator/stack/operate?operation=plus", None),
+    ("POST", "/calculator/independent/calculate", {"operation": "times", "arguments": [123, 456]}),
+    ("POST", "/calculator/independent/calculate", {"operation": "fact", "arguments": [300]}),
+    ("POST", "/calculator/independent/calculate", {"operation": "pow", "arguments": [3, 2000]}),
+    ("GET", "/calculator/health", None),
+]
+
+
+def _encode(method, path, body, padding=0):
+    payload = json.dumps(body).encode() + b" " * padding if body is not None else b""
+    head = (f"{method} {path} HTTP/1.0\r\nHost: localhost\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n").encode()
+    return head + payload
+
+
+def _exchange(port, data, chunk=None, pause=0.0):
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        if chunk:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, chunk)
+            for start in range(0, len(data), chunk):
+                sock.sendall(data[start:start + chunk])
+                time.sleep(pause)
+        else:
+            sock.sendall(data)
+        while sock.recv(65536):
+            pass
+
+
+def _fast_client(port, deadline, counts, errors, idx):
+    done = failed = 0
+    i = idx
+    while time.perf_counter() < deadline:
+        data = _encode(*MIX[i % len(MIX)])
+        i += 1
+        try:
+            _exchange(port, data)
+        except OSError:
+            failed += 1
+            continue
+        done += 1
+    counts[idx] = done
+    errors[idx] = failed
+
+
+def _slow_client(port, deadline, padding, chunk, pause):
+    data = _encode("POST", "/calculator/independent/calculate",
+                   {"operation": "plus", "arguments": [1, 2]}, padding)
+    while time.perf_counter() < deadline:
+        try:
+            _exchange(port, data, chunk, pause)
+        except OSError:
+            pass
+
+
+def measure(mode, workers, args):
+    server = main.make_server(0, mode, workers, host="127.0.0.1", app=main.create_app())
+    port = server.server_address[1]
+    serve = threading.Thread(target=server.serve_forever, daemon=True)
+    serve.start()
+    try:
+        counts = [0] * args.clients
+        errors = [0] * args.clients
+        deadline = time.perf_counter() + args.duration
+        threads = [threading.Thread(target=_fast_client, args=(port, deadline, counts, errors, n))
+                   for n in range(args.clients)]
+        threads += [threading.Thread(target=_slow_client,
+                                     args=(port, deadline, args.slow_kb * 1024,
+                                           args.chunk_kb * 1024, args.pause_ms / 1000))
+                    for _ in range(args.slow_clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    return sum(counts) / elapsed, sum(errors)
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--slow-clients", type=int, default=4)
+    parser.add_argument("--slow-kb", type=int, default=256, help="padding uploaded by each slow client")
+    parser.add_argument("--chunk-kb", type=int, default=16)
+    parser.add_argument("--pause-ms", type=float, default=5.0, help="pause between slow-client chunks")
+    parser.add_argument("--with-logs", action="store_true",
+                        help="keep the file/stdout loggers enabled while measuring")
+    args = parser.parse_args(argv)
+
+    if not args.with_logs:
+        logging.disable(logging.CRITICAL)
+        main.SimpleHandler.log_message = lambda *a: None
+
+    results = [("single", 1, *measure("single", 1, args))]
+    for workers in args.workers:
+        results.append(("threaded", workers, *measure("threaded", workers, args)))
+
+    print(f"{'mode':<10}{'workers':>8}{'req/s':>12}{'errors':>8}")
+    for mode, workers, rps, failed in results:
+        print(f"{mode:<10}{workers:>8}{rps:>12.0f}{failed:>8}")
+
+
+if __name__ == "__main__":
+    cli()
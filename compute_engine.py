@@ -0,0 +1,167 @@
+import math
+import sys
+import threading
+from collections import OrderedDict
+
+_LOG10_2 = math.log10(2)
+
+
+class LimitExceeded(ValueError):
+    """The requested computation is larger than the configured limits allow."""
+
+
+class OperationTimeout(LimitExceeded):
+    """An offloaded operation did not finish within the engine's timeout."""
+
+
+def _min_digits(n):
+    """Lower bound on the number of decimal digits of an integer."""
+    return int(max(abs(n).bit_length() - 1, 0) * _LOG10_2) + 1
+
+
+class ResultCache:
+    """LRU cache of results bounded both by entry count and by the memory size of
+    the results and their keys."""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, _ = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        # the key holds every operand, and a variadic operation (sum) has any number of them
+        size = sys.getsizeof(value) + sys.getsizeof(key) + sum(map(sys.getsizeof, key))
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = (value, size)
+            self.bytes += size
+            while len(self._items) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self.bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+class ComputeEngine:
+    """Runs calculator operations under size limits, caching large results.
+
+    Operands longer than ``max_operand_digits`` and operations whose result is
+    estimated at more than ``max_result_digits`` digits raise LimitExceeded
+    without being started.  Results estimated at ``cache_min_digits`` digits or
+    more are kept in a ResultCache, since those are the ones worth remembering.
+
+    Operations estimated at ``offload_min_digits`` digits or more run in a
+    process pool of ``pool_size`` workers (created on first use, 0 disables it),
+    so they do not hold the GIL of the serving process.  The caller blocks for at
+    most ``timeout`` seconds and then gets an OperationTimeout.
+    """
+
+    def __init__(self, max_operand_digits=4000, max_result_digits=4000, cache_min_digits=500,
+                 cache_entries=1024, cache_bytes=64 * 2 ** 20,
+                 pool_size=0, offload_min_digits=2000, timeout=5.0):
+        self.max_operand_digits = max_operand_digits
+        self.max_result_digits = max_result_digits
+        self.cache_min_digits = cache_min_digits
+        self.cache = ResultCache(cache_entries, cache_bytes)
+        self.pool_size = pool_size
+        self.offload_min_digits = offload_min_digits
+        self.timeout = timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.offloaded = 0
+        self.pending = 0
+        self.timeouts = 0
+
+    def estimate(self, op, args):
+        """Estimated decimal digits of the result of operations.Operation ``op``,
+        or 0 when it has no estimator."""
+        return op.digits(*args) if op.digits is not None else 0
+
+    def run(self, op, args):
+        for arg in args:
+            if _min_digits(arg) > self.max_operand_digits:
+                raise LimitExceeded(f"operand exceeds the limit of {self.max_operand_digits} digits")
+        digits = self.estimate(op, args)
+        if digits > self.max_result_digits:
+            about = f"about {digits}" if digits < 10 ** 9 else "far too many"  # including math.inf
+            raise LimitExceeded(f"result would have {about} digits, "
+                                f"the limit is {self.max_result_digits}")
+        if digits < self.cache_min_digits:
+            return op.func(*args)
+
+        key = (op.name, *args)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._call(op.func, args, digits)
+            self.cache.put(key, result)
+        return result
+
+    def _call(self, func, args, digits):
+        if self.pool_size <= 0 or digits < self.offload_min_digits:
+            return func(*args)
+        future = self._executor().submit(func, *args)
+        with self._pool_lock:
+            self.offloaded += 1
+            self.pending += 1
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:  # concurrent.futures.TimeoutError since 3.11
+            # a running task cannot be interrupted; the size limits bound how long it keeps its worker
+            future.cancel()
+            with self._pool_lock:
+                self.timeouts += 1
+            raise OperationTimeout(f"timed out after {self.timeout:g}s") from None
+        finally:
+            with self._pool_lock:
+                self.pending -= 1
+
+    def _executor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # imported on first use: multiprocessing costs startup time most servers never need
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    self._pool = ProcessPoolExecutor(max_workers=self.pool_size)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        with self._pool_lock:
+            pool = {"size": self.pool_size, "offloaded": self.offloaded,
+                    "pending": self.pending, "timeouts": self.timeouts}
+        return {"cache": self.cache.stats(), "pool": pool,
+                "max_operand_digits": self.max_operand_digits,
+                "max_result_digits": self.max_result_digits}
@@ -0,0 +1,145 @@
+from bisect import bisect_right
+
+FLAVORS = ("STACK", "INDEPENDENT")
+
+
+class _Index:
+    """Ascending sequence numbers of the retained entries that share one key.
+
+    Entries are only ever appended at the end and evicted from the front, so a
+    plain list plus a start offset gives O(1) append/evict and O(page) slicing.
+    """
+
+    __slots__ = ("seqs", "start")
+
+    def __init__(self):
+        self.seqs = []
+        self.start = 0
+
+    def __len__(self):
+        return len(self.seqs) - self.start
+
+    def append(self, seq):
+        self.seqs.append(seq)
+
+    def evict(self, seq):
+        if self.start < len(self.seqs) and self.seqs[self.start] == seq:
+            self.start += 1
+            # drop the dead prefix once it is at least half of the list
+            if self.start > 1024 and self.start * 2 > len(self.seqs):
+                del self.seqs[:self.start]
+                self.start = 0
+
+    def window(self, offset, limit, after, upto=None):
+        lo = self.start if after is None else bisect_right(self.seqs, after, self.start)
+        lo += offset
+        end = len(self.seqs) if upto is None else bisect_right(self.seqs, upto, self.start)
+        hi = end if limit is None else min(end, lo + limit)
+        return self.seqs[lo:hi], hi < len(self.seqs)
+
+
+class HistoryStore:
+    """Calculation history with per-flavor/per-operation indexes and running counters.
+
+    Every entry gets a sequence number (used as the paging cursor).  With
+    ``max_entries`` set the store is a ring buffer: the oldest entries are evicted,
+    while ``total()`` keeps counting everything ever recorded.  Not thread-safe;
+    callers hold the server's state lock.
+    """
+
+    def __init__(self, max_entries=None):
+        self._max_entries = max_entries or None
+        self.clear()
+
+    def clear(self):
+        self._entries = {}
+        self._next_seq = 1
+        self._all = _Index()
+        self._indexes = {}
+        self._totals = dict.fromkeys(FLAVORS, 0)
+
+    @property
+    def max_entries(self):
+        return self._max_entries
+
+    @max_entries.setter
+    def max_entries(self, value):
+        self._max_entries = value or None
+        self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest entry (0 before the first one)."""
+        return self._next_seq - 1
+
+    def __iter__(self):
+        entries = self._entries
+        return (entries[seq] for seq in self._all.seqs[self._all.start:])
+
+    def _keys(self, entry):
+        flavor = entry["flavor"]
+        operation = str(entry["operation"]).lower()
+        return flavor, ("op", operation), (flavor, operation)
+
+    def append(self, entry):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._entries[seq] = entry
+        self._all.append(seq)
+        for key in self._keys(entry):
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = _Index()
+            index.append(seq)
+        self._totals[entry["flavor"]] = self._totals.get(entry["flavor"], 0) + 1
+        if self._max_entries is not None and len(self._entries) > self._max_entries:
+            self._evict()
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def _evict(self):
+        if self._max_entries is None:
+            return
+        while len(self._entries) > self._max_entries:
+            seq = self._all.seqs[self._all.start]
+            self._all.evict(seq)
+            entry = self._entries.pop(seq)
+            for key in self._keys(entry):
+                self._indexes[key].evict(seq)
+
+    def count(self, flavor=None):
+        """Number of retained entries, optionally of one flavor."""
+        if flavor is None:
+            return len(self._entries)
+        index = self._indexes.get(flavor)
+        return len(index) if index else 0
+
+    def total(self, flavor):
+        """Number of entries of a flavor ever recorded, evicted ones included."""
+        return self._totals.get(flavor, 0)
+
+    def page(self, flavor=None, operation=None, offset=0, limit=None, after=None, upto=None):
+        """Returns (entries, next_cursor) for one page in insertion order.
+
+        ``after`` is a cursor returned by a previous call; ``next_cursor`` is None
+        when there is nothing past this page.  ``upto`` (a last_seq value) leaves
+        out entries recorded after it.
+        """
+        if flavor is None and operation is None:
+            index = self._all
+        elif operation is None:
+            index = self._indexes.get(flavor)
+        elif flavor is None:
+            index = self._indexes.get(("op", operation.lower()))
+        else:
+            index = self._indexes.get((flavor, operation.lower()))
+        if index is None:
+            return [], None
+        seqs, more = index.window(offset, limit, after, upto)
+        entries = self._entries
+        return [entries[seq] for seq in seqs], (seqs[-1] if more and seqs else None)
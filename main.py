@@ -1,68 +1,99 @@
+import io
 import json
 import logging
 import os
+import re
+import signal
+import socket
+import sys
+import threading
 import time
+from email.utils import formatdate
+from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from math import factorial
-from urllib.parse import urlparse, parse_qs
-import operator
+from urllib.parse import parse_qs
+
+from admission import AdmissionControl
+from async_logging import OVERFLOW_POLICIES, BatchingQueueHandler
+from compute_engine import ComputeEngine
+from history_store import HistoryStore
+from metrics import CONTENT_TYPE as METRICS_TYPE, RequestMetrics
+from operations import OPERATIONS, load_plugins
+from response_cache import ResponseCache
+from rpn import ProgramCache, ProgramError, run_program
+from sessions import SESSION_NAME, Session, SessionStore
+from stack_store import IntStack
 
 # ---------- Calculator core ----------
-stack = []
-history = []
-request_counter = 0  # 1‑based counter, incremented per request
-
-OPERATIONS = {
-    "plus": (2, operator.add),
-    "minus": (2, operator.sub),
-    "times": (2, operator.mul),
-    "divide": (2, lambda x, y: x // y),
-    "pow": (2, pow),
-    "abs": (1, abs),
-    "fact": (1, factorial),
-}
+# The stacks, histories and request count belong to an App (see create_app());
+# what is defined here is shared by every App in the process.
+
+# Requests naming a session (X-Calculator-Session header or a /sessions/<name>
+# path prefix) get a stack and history of their own with their own lock.
+SESSION_HEADER = "X-Calculator-Session"
+SESSION_PREFIX = "/sessions/"
+
+# operations.OPERATIONS plus those of the plugin modules named in CALC_OPERATION_PLUGINS
+load_plugins(filter(None, os.environ.get("CALC_OPERATION_PLUGINS", "").split(",")), OPERATIONS)
+
+# Operand/result size limits and the result cache for expensive operations.  The
+# process pool is off unless CALC_POOL_SIZE is set: within the default digit limits
+# an operation takes well under a millisecond, less than the round trip to a
+# worker, so offloading only pays with larger limits.
+ENGINE = ComputeEngine(
+    max_operand_digits=int(os.environ.get("CALC_MAX_OPERAND_DIGITS", 4000)),
+    max_result_digits=int(os.environ.get("CALC_MAX_RESULT_DIGITS", 4000)),
+    cache_min_digits=int(os.environ.get("CALC_CACHE_MIN_DIGITS", 500)),
+    cache_entries=int(os.environ.get("CALC_CACHE_ENTRIES", 1024)),
+    cache_bytes=int(os.environ.get("CALC_CACHE_BYTES", 64 * 2 ** 20)),
+    pool_size=int(os.environ.get("CALC_POOL_SIZE", 0)),
+    offload_min_digits=int(os.environ.get("CALC_OFFLOAD_MIN_DIGITS", 2000)),
+    timeout=float(os.environ.get("CALC_OPERATION_TIMEOUT", 5.0)),
+)
+# compiled programs for POST /calculator/stack/program, keyed by their token list
+PROGRAMS = ProgramCache(OPERATIONS, int(os.environ.get("CALC_PROGRAM_CACHE", 256)))
+
+# results (and operands) have to survive int <-> str conversion for JSON and the logs
+if max(ENGINE.max_result_digits, ENGINE.max_operand_digits) >= sys.get_int_max_str_digits():
+    sys.set_int_max_str_digits(max(ENGINE.max_result_digits, ENGINE.max_operand_digits) + 100)
 
 
 def perform_operation(name, args):
-    """Executes a calculator operation and returns (result, error‑msg, http‑code)."""
-    op = name.lower()
-
-    if op not in OPERATIONS:
-        return None, f"Error: unknown operation: {name}", 409
-
-    expected, func = OPERATIONS[op]
-
-    if len(args) < expected:
-        return None, f"Error: Not enough arguments to perform the operation {name}", 409
-    if len(args) > expected:
-        return None, f"Error: Too many arguments to perform the operation {name}", 409
+    """Executes a calculator operation on client-supplied arguments and returns (result, error‑msg, http‑code)."""
+    return OPERATIONS.perform(name, args, ENGINE.run)
 
-    try:
-        args = [int(arg) for arg in args]
-    except ValueError:
-        return None, "Error: Arguments must be numeric (integers)", 409
-
-    if op == "divide" and args[1] == 0:
-        return None, "Error while performing operation Divide: division by 0", 409
-    if op == "fact" and args[0] < 0:
-        return None, "Error while performing operation Factorial: not supported for the negative number", 409
-
-    try:
-        result = func(*args)
-        return result, None, 200
-    except Exception as exc:
-        return None, f"Error while performing operation {name}: {str(exc)}", 409
 
+def perform_on_ints(name, args):
+    """perform_operation for a known operation and arguments that are already ints of the
+    right number, such as values popped off the stack: no conversion or arity checks."""
+    return OPERATIONS.get(name).apply(args, ENGINE.run, name)
 
 
 # ---------- Logging setup (fixed!) ----------
-import sys
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # ← כאן נמצא server.py
 LOG_DIR  = os.path.join(BASE_DIR, "logs")              # logs ליד הקובץ
-os.makedirs(LOG_DIR, exist_ok=True)
 
 DATEFMT = "%Y-%m-%d %H:%M:%S"
 
+# "sync" writes from the request thread; "async" hands records to a background
+# writer (see async_logging.BatchingQueueHandler). Change with configure_logging().
+LOG_OPTIONS = {
+    "mode": os.environ.get("CALC_LOG_MODE", "sync"),
+    "queue_size": int(os.environ.get("CALC_LOG_QUEUE_SIZE", 10000)),
+    "overflow": os.environ.get("CALC_LOG_OVERFLOW", "block"),
+    "batch_size": int(os.environ.get("CALC_LOG_BATCH", 256)),
+    "flush_ms": float(os.environ.get("CALC_LOG_FLUSH_MS", 50)),
+}
+
+
+class _ReqFilter(logging.Filter):
+    # תן לשורה לוג תמיד request_num (גם אם extra לא הגיע)
+    def filter(self, record):
+        if not hasattr(record, "request_num"):
+            record.request_num = 0
+        return True
+
+
 def _build_logger(name: str,
                   filename: str,
                   level: int,
@@ -72,29 +103,40 @@ def _build_logger(name: str,
     בלי קשר לאיפה מריצים את python.
     """
     logger = logging.getLogger(name)
-    logger.handlers.clear()         # שלא יהיו כפילויות אם מרעננים קוד
+    for old in list(logger.handlers):   # closing also drains a queued writer
+        old.close()
+    # שלא יהיו כפילויות אם מרעננים קוד; a new list, since a record may be
+    # iterating over the old one (see _OpenOnFirstRecord)
+    logger.handlers = []
+    logger.filters.clear()
     logger.setLevel(level)
     logger.propagate = False
 
     fmt = "%(asctime)s %(levelname)s: %(message)s | request #%(request_num)s"
     formatter = logging.Formatter(fmt, datefmt=DATEFMT)
 
+    os.makedirs(LOG_DIR, exist_ok=True)
     file_path   = os.path.join(LOG_DIR, filename)
     file_handler = logging.FileHandler(file_path, mode="a", encoding="utf-8", delay=False)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    targets = [file_handler]
 
     if to_stdout:
         console = logging.StreamHandler(sys.stdout)
         console.setFormatter(formatter)
-        logger.addHandler(console)
-
-    # תן לשורה לוג תמיד request_num (גם אם extra לא הגיע)
-    class _ReqFilter(logging.Filter):
-        def filter(self, record):
-            if not hasattr(record, "request_num"):
-                record.request_num = 0
-            return True
+        targets.append(console)
+
+    if LOG_OPTIONS["mode"] == "async":
+        logger.addHandler(BatchingQueueHandler(
+            targets,
+            queue_size=LOG_OPTIONS["queue_size"],
+            overflow=LOG_OPTIONS["overflow"],
+            batch_size=LOG_OPTIONS["batch_size"],
+            flush_interval=LOG_OPTIONS["flush_ms"] / 1000,
+        ))
+    else:
+        for target in targets:
+            logger.addHandler(target)
 
     logger.addFilter(_ReqFilter())
 
@@ -106,9 +148,57 @@ def _build_logger(name: str,
     return logger
 
 
-REQUEST_LOGGER = _build_logger("request-logger", "requests.log", logging.INFO, to_stdout=True)
-STACK_LOGGER = _build_logger("stack-logger", "stack.log", logging.INFO)
-INDEPENDENT_LOGGER = _build_logger("independent-logger", "independent.log", logging.DEBUG)
+_LOG_FILES = {
+    "request-logger": ("requests.log", True),
+    "stack-logger": ("stack.log", False),
+    "independent-logger": ("independent.log", False),
+}
+_LOGS_OPENED = False
+_OPEN_LOCK = threading.Lock()
+
+
+def _open_logs():
+    """Builds the three loggers (files, console, async writer) unless that already happened."""
+    global _LOGS_OPENED
+    with _OPEN_LOCK:
+        if not _LOGS_OPENED:
+            for name, logger in ALL_LOGGERS.items():
+                filename, to_stdout = _LOG_FILES[name]
+                _build_logger(name, filename, logger.level, to_stdout=to_stdout)
+            _LOGS_OPENED = True
+
+
+class _OpenOnFirstRecord(logging.Handler):
+    """Stands in for a logger's handlers until it logs for the first time.
+
+    Opening the log files (and starting async writers) is left to the first
+    record, so importing main.py or building an App touches no files.
+    """
+
+    def __init__(self, logger):
+        super().__init__()
+        self.logger = logger
+
+    def handle(self, record):
+        _open_logs()
+        for handler in self.logger.handlers:
+            if handler is not self and record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
+def _declare_logger(name, level):
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.addFilter(_ReqFilter())
+    logger.addHandler(_OpenOnFirstRecord(logger))
+    return logger
+
+
+REQUEST_LOGGER = _declare_logger("request-logger", logging.INFO)
+STACK_LOGGER = _declare_logger("stack-logger", logging.INFO)
+INDEPENDENT_LOGGER = _declare_logger("independent-logger", logging.DEBUG)
 
 ALL_LOGGERS = {
     "request-logger": REQUEST_LOGGER,
@@ -117,26 +207,667 @@ ALL_LOGGERS = {
 }
 
 
+def configure_logging(**options):
+    """Updates LOG_OPTIONS and rebuilds the three loggers (if open), keeping their current levels."""
+    if options.get("mode", LOG_OPTIONS["mode"]) not in ("sync", "async"):
+        raise ValueError(f"unknown log mode: {options['mode']}")
+    if options.get("overflow", LOG_OPTIONS["overflow"]) not in OVERFLOW_POLICIES:
+        raise ValueError(f"unknown overflow policy: {options['overflow']}")
+    LOG_OPTIONS.update(options)
+    with _OPEN_LOCK:
+        if _LOGS_OPENED:
+            for name, logger in ALL_LOGGERS.items():
+                filename, to_stdout = _LOG_FILES[name]
+                _build_logger(name, filename, logger.level, to_stdout=to_stdout)
+
+
+def log_queue_stats():
+    """Queue depth and dropped-record count per logger (empty in sync mode)."""
+    return {name: handler.stats()
+            for name, logger in ALL_LOGGERS.items()
+            for handler in logger.handlers if isinstance(handler, BatchingQueueHandler)}
+
+
+class _Joined:
+    """Log argument rendering ``', '.join(map(str, items))`` only if the record is emitted."""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+    def __str__(self):
+        return ", ".join(map(str, self.items))
+
+
+# ---------- state operations ----------
+# Every read or change of a session's stack and history is one of these
+# functions, run by App.state under the session's lock: f(session, request_num, *args)
+# returns (value, ticket), the ticket from App.journal() (0 if nothing was logged).
+# Values and arguments are plain data, so that in prefork mode the workers can
+# send them to the coordinator process that owns the state.
+def _journal_change(session, *record):
+    """Records a change of the session: bumps its version (which invalidates
+    cached responses and ETags) and logs it with the session's journal
+    (App.journal for the default session; named sessions are not persisted)."""
+    session.version += 1
+    if session.journal is None:
+        return 0
+    return session.journal(*record)
+
+
+def _state_version(session, request_num):
+    """The session version and the history totals, both O(1)."""
+    history = session.history
+    return (session.version, (history.total("STACK"), history.total("INDEPENDENT"))), 0
+
+
+def _state_size(session, request_num, with_values):
+    return (len(session.stack), session.stack.top() if with_values else None, session.version), 0
+
+
+def _state_operate(session, request_num, operation, arg_cnt):
+    """Pops the arguments (all of them when arg_cnt is None), computes and records
+    the result, or puts them back on an error."""
+    size = len(session.stack)
+    if arg_cnt is None and size:
+        arg_cnt = size
+    elif arg_cnt is None or size < arg_cnt:
+        required = "at least 1" if arg_cnt is None else arg_cnt
+        error = (f"Error: cannot implement operation {operation}. "
+                 f"It requires {required} arguments and the stack has only {size} arguments")
+        return (error, None, None, size), 0
+    args = session.stack.pop_many(arg_cnt)
+    result, error, code = perform_on_ints(operation, args)
+    if error:
+        session.stack.extend(args[::-1])
+        return (error, None, args, len(session.stack)), 0
+    entry = {"flavor": "STACK", "operation": operation, "arguments": args, "result": result}
+    session.history.append(entry)
+    ticket = _journal_change(session, request_num, "operate", arg_cnt, entry)
+    return (None, result, args, len(session.stack)), ticket
+
+
+def _state_push(session, request_num, args):
+    size_before = len(session.stack)
+    session.stack.extend(args)
+    ticket = _journal_change(session, request_num, "push", args) if args else 0
+    return (size_before, len(session.stack)), ticket
+
+
+def _state_remove(session, request_num, count):
+    size = len(session.stack)
+    if count > size:
+        return (f"Error: cannot remove {count} from the stack. It has only {size} arguments", size), 0
+    session.stack.truncate(count)
+    ticket = _journal_change(session, request_num, "pop", count) if count > 0 else 0
+    return (None, len(session.stack)), ticket
+
+
+def _state_program(session, request_num, program, scratch):
+    """Runs a compiled program on a copy of the values it reaches, so a failing step
+    leaves the stack as it was; the last value is popped as the result."""
+    stack = session.stack
+    if not scratch and len(stack) < program.needs:
+        error = (f"Error: cannot run the program. It requires {program.needs} arguments "
+                 f"and the stack has only {len(stack)} arguments")
+        return (error, None, None, len(stack)), 0
+    if scratch and program.needs:
+        error = f"Error: cannot run the program. It requires {program.needs} arguments on an empty stack"
+        return (error, None, None, len(stack)), 0
+    taken = [] if scratch else stack.pop_many(program.needs)
+    values = taken[::-1]
+    steps, error = run_program(program, values, perform_on_ints)
+    if error:
+        stack.extend(taken[::-1])
+        return (error, None, None, len(stack)), 0
+    result = values.pop()
+    flavor = "INDEPENDENT" if scratch else "STACK"
+    entries = [{"flavor": flavor, "operation": name, "arguments": args, "result": value}
+               for name, args, value in steps]
+    session.history.extend(entries)
+    if scratch:
+        ticket = _journal_change(session, request_num, "history", entries) if entries else 0
+    else:
+        left = IntStack.convert(values)
+        stack.extend(left)
+        ticket = _journal_change(session, request_num, "program", len(taken), left, entries)
+    return (None, result, steps, len(stack)), ticket
+
+
+def _state_dump(session, request_num, page):
+    """The stack's values: a list, top first, when they fit in a page, else an
+    IntStack copy (8 bytes per value, against several times that as JSON text)."""
+    stack = session.stack
+    return (stack.copy() if len(stack) > page else stack.top()), 0
+
+
+def _state_record(session, request_num, entries):
+    """Adds independent calculations to the history."""
+    session.history.extend(entries)
+    return None, _journal_change(session, request_num, "history", entries) if entries else 0
+
+
+def _state_history(session, request_num, flavor, operation, offset, limit, cursor, upto, with_totals):
+    """One page of history entries (see HistoryStore.page), the cursor after it
+    and the session version it was read at.
+
+    ``upto`` None means up to the newest entry; the sequence number used is
+    returned so later pages of the same response can pass it.
+    """
+    history = session.history
+    if upto is None:
+        upto = history.last_seq
+    page, next_cursor = history.page(flavor, operation, offset, limit, cursor, upto)
+    totals = (history.total("STACK"), history.total("INDEPENDENT")) if with_totals else None
+    return (page, next_cursor, upto, totals, session.version), 0
+
+
+STATE_OPERATIONS = {
+    "version": _state_version,
+    "size": _state_size,
+    "operate": _state_operate,
+    "push": _state_push,
+    "remove": _state_remove,
+    "program": _state_program,
+    "dump": _state_dump,
+    "record": _state_record,
+    "history": _state_history,
+}
+
+
+class LocalState:
+    """Runs state operations on ``app``'s sessions in this process, each under its
+    session's lock.
+
+    Requests are numbered from 1 by a counter with its own lock, so numbering a
+    request never waits behind a long stack operation; ``counter`` (a
+    prefork.SharedCounter) replaces it when the count is shared with prefork workers.
+    """
+
+    def __init__(self, app, counter=None):
+        self.app = app
+        self.counter = counter
+        self._count = 0
+        self._count_lock = threading.Lock()
+        # a restarted prefork coordinator starts over from the App copied at fork
+        # time: move the default session past any version clients may hold
+        session = app.default_session
+        session.version = max(session.version, time.time_ns())
+
+    def call(self, operation, session_name, request_num, *args):
+        app = self.app
+        if operation == "stats":  # about the whole App rather than one session
+            return app.stats()
+        session = app.default_session if session_name is None else app.sessions.get(session_name)
+        with session.lock:
+            value, ticket = STATE_OPERATIONS[operation](session, request_num, *args)
+        app.durable(ticket)
+        return value
+
+    def begin_request(self):
+        """Numbers a new request."""
+        if self.counter is not None:
+            return self.counter.next()
+        with self._count_lock:
+            self._count += 1
+            return self._count
+
+    def request_count(self):
+        return self._count if self.counter is None else self.counter.value
+
+    def set_log_level(self, logger_name, level):
+        ALL_LOGGERS[logger_name].setLevel(level)
+
+    def restore_request_count(self, count):
+        if self.counter is not None:
+            # a restarted prefork coordinator must not hand out numbers the workers already used
+            self.counter.value = max(self.counter.value, count)
+        with self._count_lock:
+            self._count = count
+
+
+class RemoteState:
+    """State operations sent to the prefork coordinator, which runs them with a
+    LocalState (see run_prefork()).  Request numbers come from a shared counter
+    and logger levels from shared settings, so every worker numbers and logs
+    as one server would."""
+
+    def __init__(self, client, counter, log_levels):
+        self.client = client
+        self.counter = counter
+        self.log_levels = log_levels
+        self._levels_seen = -1
+
+    def call(self, operation, session_name, request_num, *args):
+        return self.client.call(operation, session_name, request_num, *args)
+
+    def begin_request(self):
+        """Numbers a new request, first picking up logger levels set by other workers."""
+        if self.log_levels.version != self._levels_seen:
+            self._levels_seen, levels = self.log_levels.read()
+            for logger, level in zip(ALL_LOGGERS.values(), levels):
+                logger.setLevel(level)
+        return self.counter.next()
+
+    def request_count(self):
+        return self.counter.value
+
+    def restore_request_count(self, count):
+        self.counter.value = count
+
+    def set_log_level(self, logger_name, level):
+        self.log_levels.write(list(ALL_LOGGERS).index(logger_name), level)
+        ALL_LOGGERS[logger_name].setLevel(level)
+
+
+# ---------- metrics ----------
+def _build_metrics(app):
+    """The registry behind GET /metrics: request counters/latencies recorded by
+    _handle_request; the rest is read on scrape.  In prefork mode each worker has
+    its own: requests, cache and pool figures are the scraped worker's, the state
+    figures the coordinator's."""
+    metrics = RequestMetrics()
+    metrics.add_collector("stack_size", "gauge", "Values on the default session's stack.",
+                          lambda: app.state.call("stats", None, 0)["stack"])
+    metrics.add_collector("history_entries", "gauge", "History entries retained by the default session.",
+                          lambda: app.state.call("stats", None, 0)["history"])
+    metrics.add_collector("history_recorded_total", "counter", "History entries ever recorded, by flavor.",
+                          lambda: {(flavor,): count
+                                   for flavor, count in app.state.call("stats", None, 0)["recorded"].items()},
+                          labels=("flavor",))
+    metrics.add_collector("sessions", "gauge", "Named sessions held in memory.",
+                          lambda: app.state.call("stats", None, 0)["sessions"])
+    metrics.add_collector("log_queue_depth", "gauge", "Log records waiting for the writer thread (async logging).",
+                          lambda: {(name,): stats["queued"] for name, stats in log_queue_stats().items()},
+                          labels=("logger",))
+    metrics.add_collector("log_dropped_total", "counter", "Log records dropped by a full queue.",
+                          lambda: {(name,): stats["dropped"] for name, stats in log_queue_stats().items()},
+                          labels=("logger",))
+    metrics.add_collector("result_cache_entries", "gauge", "Results held in the compute engine's cache.",
+                          lambda: ENGINE.cache.stats()["entries"])
+    metrics.add_collector("result_cache_bytes", "gauge", "Approximate size of the cached results.",
+                          lambda: ENGINE.cache.stats()["bytes"])
+    metrics.add_collector("result_cache_lookups_total", "counter", "Result cache lookups, by outcome.",
+                          lambda: {("hit",): ENGINE.cache.hits, ("miss",): ENGINE.cache.misses},
+                          labels=("outcome",))
+    metrics.add_collector("result_cache_evictions_total", "counter", "Results evicted from the cache.",
+                          lambda: ENGINE.cache.evictions)
+    metrics.add_collector("pool_pending", "gauge", "Operations waiting on the process pool.",
+                          lambda: ENGINE.pending)
+    metrics.add_collector("pool_offloaded_total", "counter", "Operations sent to the process pool.",
+                          lambda: ENGINE.offloaded)
+    metrics.add_collector("pool_timeouts_total", "counter", "Offloaded operations that timed out.",
+                          lambda: ENGINE.timeouts)
+    metrics.add_collector("response_cache_bytes", "gauge", "Size of the cached history responses.",
+                          lambda: app.responses.stats()["bytes"])
+    metrics.add_collector("response_cache_lookups_total", "counter", "History response cache lookups, by outcome.",
+                          lambda: {("hit",): app.responses.hits, ("miss",): app.responses.misses},
+                          labels=("outcome",))
+    metrics.add_collector("admitted_in_flight", "gauge", "Admitted requests not finished yet.",
+                          lambda: app.admission.stats()["in_flight"])
+    metrics.add_collector("rejected_total", "counter", "Requests turned away by admission control, by reason.",
+                          lambda: {(reason,): count for reason, count in app.admission.stats()["rejected"].items()},
+                          labels=("reason",))
+    return metrics
+
+
+# ---------- application ----------
+class App:
+    """One calculator server's state: the default session (``stack`` and
+    ``history``), the named sessions, the request count, persistence and metrics.
+
+    Every server (make_server(), start_async_server(), run()) serves one App and
+    its handlers reach it as ``self.app``, so a process can run independent
+    instances side by side.  ``state`` runs the state operations: a LocalState,
+    or in prefork workers a RemoteState.  Named sessions are dropped after
+    ``session_ttl`` idle seconds or beyond ``max_sessions``, and are not persisted.
+    ``admission`` (an admission.AdmissionControl, no limits by default) decides
+    which requests are served at all; in prefork mode every worker applies it
+    on its own, as it keeps its own ``responses`` (a ResponseCache of history pages).
+    """
+
+    def __init__(self, history_size=0, max_sessions=1024, session_ttl=1800.0, admission=None, responses=None):
+        self.default_session = Session("default", IntStack(), HistoryStore(history_size), journal=self.journal)
+        self.sessions = SessionStore(self.default_session, max_sessions=max_sessions, ttl=session_ttl)
+        self.persistence = None  # a persistence.Persistence once enable_persistence() has run
+        self.state = LocalState(self)
+        self.admission = AdmissionControl() if admission is None else admission
+        self.responses = ResponseCache() if responses is None else responses
+        self.metrics = _build_metrics(self)
+
+    @property
+    def stack(self):
+        return self.default_session.stack
+
+    @property
+    def history(self):
+        return self.default_session.history
+
+    def stats(self):
+        """Sizes of the default session's stack and history, and the number of sessions."""
+        with self.default_session.lock:
+            history = self.history
+            return {"stack": len(self.stack), "history": len(history),
+                    "recorded": {flavor: history.total(flavor) for flavor in ("STACK", "INDEPENDENT")},
+                    "sessions": len(self.sessions)}
+
+    def journal(self, *record):
+        """Logs one change of the default session to the write-ahead log and returns its commit ticket.
+
+        Called under the session lock in the same critical section as the
+        change.  Records are (request_num, kind, ...) tuples, replayed by
+        _apply_record().
+        """
+        persistence = self.persistence
+        if persistence is None:
+            return 0
+        ticket = persistence.append(record)
+        if persistence.should_snapshot():
+            persistence.snapshot(self.state.request_count(), self.stack, self.history)
+        return ticket
+
+    def durable(self, ticket):
+        """Blocks until a journaled change is on disk, when the fsync policy asks for that."""
+        if ticket:
+            self.persistence.commit(ticket)
+
+    def _apply_record(self, record):
+        stack, history = self.stack, self.history
+        kind = record[1]
+        if kind == "push":
+            stack.extend(record[2])
+        elif kind == "pop":
+            stack.truncate(record[2])
+        elif kind == "history":
+            history.extend(record[2])
+        elif kind == "operate":
+            stack.truncate(record[2])
+            history.append(record[3])
+        elif kind == "program":
+            stack.truncate(record[2])
+            stack.extend(record[3])
+            history.extend(record[4])
+        else:
+            raise ValueError(f"unknown log record: {kind}")
+
+    def enable_persistence(self, directory, fsync="interval", interval_ms=50, snapshot_every=1_000_000):
+        """Restores the default session and the request count from ``directory`` and
+        journals every later change there (see persistence.Persistence).  Returns
+        the number of log records replayed."""
+        from persistence import Persistence
+
+        store = Persistence(directory, fsync, interval_ms, snapshot_every)
+        counter, saved_stack, saved_history, records = store.recover()
+        session = self.default_session
+        with session.lock:
+            session.stack.clear()
+            session.stack.extend(list(saved_stack))
+            if saved_history is not None:
+                saved_history.max_entries = session.history.max_entries
+                session.history = saved_history
+            else:
+                session.history.clear()
+            for record in records:
+                self._apply_record(record)
+                counter = max(counter, record[0])
+            session.version += 1
+            self.state.restore_request_count(counter)
+            self.persistence = store
+        return len(records)
+
+    def close(self):
+        if self.persistence is not None:
+            self.persistence.close()
+
+
+def create_app(history_size=None, max_sessions=None, session_ttl=None, admission=None, responses=None):
+    """Builds an App.  Options left out come from CALC_HISTORY_SIZE (0 = keep the
+    whole history), CALC_MAX_SESSIONS and CALC_SESSION_TTL, and the admission
+    limits from CALC_MAX_BODY_BYTES, CALC_MAX_ARGUMENTS (per push or batch),
+    CALC_RATE_LIMIT and CALC_RATE_BURST (requests/s per client address) and
+    CALC_MAX_IN_FLIGHT (0 turns a limit off), and the cache of history
+    responses from CALC_RESPONSE_CACHE_ENTRIES and CALC_RESPONSE_CACHE_BYTES."""
+    if history_size is None:
+        history_size = int(os.environ.get("CALC_HISTORY_SIZE", 0))
+    if max_sessions is None:
+        max_sessions = int(os.environ.get("CALC_MAX_SESSIONS", 1024))
+    if session_ttl is None:
+        session_ttl = float(os.environ.get("CALC_SESSION_TTL", 1800))
+    if admission is None:
+        admission = AdmissionControl(
+            max_body=int(os.environ.get("CALC_MAX_BODY_BYTES", 8 * 2 ** 20)),
+            max_arguments=int(os.environ.get("CALC_MAX_ARGUMENTS", 100_000)),
+            rate=float(os.environ.get("CALC_RATE_LIMIT", 0)),
+            burst=float(os.environ.get("CALC_RATE_BURST", 0)) or None,
+            max_in_flight=int(os.environ.get("CALC_MAX_IN_FLIGHT", 0)),
+        )
+    if responses is None:
+        responses = ResponseCache(
+            max_entries=int(os.environ.get("CALC_RESPONSE_CACHE_ENTRIES", 256)),
+            max_bytes=int(os.environ.get("CALC_RESPONSE_CACHE_BYTES", 32 * 2 ** 20)),
+        )
+    return App(history_size, max_sessions, session_ttl, admission, responses)
+
+
+# ---------- responses ----------
+# CALC_JSON=orjson uses orjson when it is installed; the default is the stdlib codec,
+# whose output ({"result": 1}, with spaces) the API has always produced.
+JSON_CODEC = os.environ.get("CALC_JSON", "stdlib")
+orjson = None
+if JSON_CODEC == "orjson":
+    try:
+        import orjson
+    except ImportError:
+        print("[JSON] orjson is not installed, using the stdlib json module")
+        JSON_CODEC = "stdlib"
+
+# orjson only handles 64-bit integers: it refuses to dump bigger ones and reads them
+# back as floats, so any body with a run of 19+ digits goes through the stdlib
+_LONG_NUMBER = re.compile(rb"\d{19}")
+
+
+def _orjson_dumps(obj):
+    try:
+        return orjson.dumps(obj)
+    except TypeError:
+        return json.dumps(obj).encode()
+
+
+def _orjson_loads(data):
+    if _LONG_NUMBER.search(data):
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj).encode()
+
+
+if JSON_CODEC == "orjson":
+    dumps_bytes, loads_bytes = _orjson_dumps, _orjson_loads
+else:
+    dumps_bytes, loads_bytes = _stdlib_dumps, json.loads
+
+JSON_TYPE = "application/json"
+TEXT_TYPE = "text/plain; charset=utf-8"
+
+
+def _reason(code):
+    try:
+        return HTTPStatus(code).phrase
+    except ValueError:
+        return ""
+
+
+_status_lines = {}
+
+
+def _status_line(version, code):
+    line = _status_lines.get((version, code))
+    if line is None:
+        line = _status_lines[(version, code)] = f"{version} {code} {_reason(code)}\r\n".encode()
+    return line
+
+
+_date_cache = [0, b""]
+
+
+def _http_date():
+    """The current ``Date:`` header line, rebuilt at most once a second."""
+    now = int(time.time())
+    if _date_cache[0] != now:
+        _date_cache[0] = now
+        _date_cache[1] = f"Date: {formatdate(now, usegmt=True)}\r\n".encode()
+    return _date_cache[1]
+
+
+def _response_tail(content_type, body, headers=()):
+    """Entity headers, the blank line and the body: everything after status/Date/Server."""
+    extra = "".join(f"{k}: {v}\r\n" for k, v in headers)
+    return (f"Content-Type: {content_type}\r\n{extra}Content-Length: {len(body)}\r\n\r\n"
+            .encode("latin-1") + body)
+
+
+def _rejection_tail(message, retry_after=None):
+    """An error body for a request answered before it was routed."""
+    headers = [("Retry-After", retry_after)] if retry_after else ()
+    return _response_tail(JSON_TYPE, dumps_bytes({"errorMessage": message}), headers)
+
+
+HEALTH_RESPONSE = _response_tail(TEXT_TYPE, b"OK")
+NOT_FOUND_RESPONSE = _response_tail(JSON_TYPE, dumps_bytes({"errorMessage": "Not Found"}))
+
+
+STREAM_HEADERS = b"Content-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n"
+
+
+def _etag(version):
+    return f'"{version}"'
+
+
+def _etag_header(etag):
+    return b"ETag: %s\r\n" % etag.encode() if etag else b""
+
+
+def _etag_matches(if_none_match, etag):
+    """Whether an If-None-Match value names ``etag`` (compared weakly, as for GET)."""
+    if not if_none_match:
+        return False
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+
+def _chunk(data):
+    return b"%X\r\n%s\r\n" % (len(data), data)
+
+
+def _result_tail(result):
+    # {"result": <int>} is the most common body by far; skip the JSON encoder for it
+    if type(result) is int:
+        body = b'{"result": %d}' % result
+        return b"Content-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+    return _response_tail(JSON_TYPE, dumps_bytes({"result": result}))
+
+
 # ---------- HTTP handler ----------
-class SimpleHandler(BaseHTTPRequestHandler):
-    def _set_json(self, code=200):
-        self.send_response(code)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
+# Route table shared by every server engine: (HTTP verb, path) -> implementation method.
+ROUTES = {
+    ("GET", "/calculator/health"): "_health",
+    ("GET", "/calculator/stack/size"): "_stack_size",
+    ("GET", "/calculator/stack/operate"): "_stack_operate",
+    ("GET", "/calculator/history"): "_history",
+    ("GET", "/calculator/stack/arguments"): "_stack_dump",
+    ("GET", "/logs/level"): "_get_log_level",
+    ("GET", "/metrics"): "_metrics",
+    ("POST", "/calculator/independent/calculate"): "_independent_calculate",
+    ("POST", "/calculator/independent/batch"): "_independent_batch",
+    ("POST", "/calculator/stack/program"): "_stack_program",
+    ("PUT", "/calculator/stack/arguments"): "_stack_push",
+    ("PUT", "/logs/level"): "_set_log_level",
+    ("DELETE", "/calculator/stack/arguments"): "_stack_remove",
+}
+SUPPORTED_METHODS = ("GET", "POST", "PUT", "DELETE")
+
+# Batches larger than this are written to the socket while they are computed.
+BATCH_STREAM_THRESHOLD = 1000
+BATCH_STREAM_CHUNK = 500
+# History pages and stack dumps longer than this are streamed in chunks of this
+# many entries, so memory stays flat however large the response is.
+STREAM_PAGE = int(os.environ.get("CALC_STREAM_PAGE", 1000))
+
+
+class CalculatorRoutes:
+    """Calculator endpoints, independent of the server engine.
+
+    Subclasses provide ``path``, ``command``, ``headers`` and ``rfile`` (as
+    BaseHTTPRequestHandler does), the ``app`` they serve, plus ``_write_response``
+    and ``_send_stream``.
+    """
+
+    def dispatch(self):
+        target = self.path
+        session_name = self.headers.get(SESSION_HEADER)
+        if target.startswith(SESSION_PREFIX):
+            session_name, _, rest = target[len(SESSION_PREFIX):].partition("/")
+            target = "/" + rest
+        handler, self._raw_query = resolve_route(self.command, target)
+        self._route_path = target.partition("?")[0]
+        self._query = None
+        self._handle_request(lambda: self._in_session(handler, session_name))
+
+    def _in_session(self, handler, session_name):
+        if session_name is not None and not SESSION_NAME.fullmatch(session_name):
+            self._fail("Error: session names are 1-64 letters, digits, '_', '.' or '-'", 400)
+            return
+        self.session_name = session_name
+        handler(self)
+
+    def _state(self, operation, *args):
+        """Runs one of STATE_OPERATIONS on this request's session."""
+        return self.app.state.call(operation, self.session_name, self.request_num, *args)
+
+    def _param(self, name, default=None):
+        """First value of a query-string parameter; the query is parsed on first use."""
+        if self._query is None:
+            self._query = parse_qs(self._raw_query) if self._raw_query else {}
+        return self._query.get(name, [default])[0]
+
+    def _send_result(self, result):
+        self._write_response(200, _result_tail(result))
+
+    def _send_json(self, obj, code=200):
+        self._write_response(code, _response_tail(JSON_TYPE, dumps_bytes(obj)))
+
+    def _send_text(self, text, code=200):
+        self._write_response(code, _response_tail(TEXT_TYPE, text.encode()))
+
+    def _send_stream(self, chunks, etag=None):
+        """Sends a 200 JSON response whose body is the bytes yielded by ``chunks``.
+
+        Each engine writes the chunks as they are produced (chunked transfer
+        encoding for HTTP/1.1 clients, close-delimited otherwise), so the
+        generator may run state operations between chunks.
+        """
+        raise NotImplementedError
 
-    def _set_text(self, code=200):
-        self.send_response(code)
-        self.send_header("Content-Type", "text/plain; charset=utf-8")
-        self.end_headers()
+    def _not_modified(self, etag):
+        """Answers 304 if the client's If-None-Match already names ``etag``."""
+        if _etag_matches(self.headers.get("If-None-Match"), etag):
+            self._write_response(304, _etag_header(etag) + b"\r\n")
+            return True
+        return False
 
     def _handle_request(self, method_handler):
-        global request_counter
-        request_counter += 1
-        self.request_num = request_counter
-        start = time.perf_counter()
+        app = self.app
+        self.request_num = app.state.begin_request()
+        self.status = 500
+        self._streaming = False
+        self._finish_deferred = False
+        app.metrics.begin()
+        self._start = time.perf_counter()
 
         REQUEST_LOGGER.info(
-            f"Incoming request | #{self.request_num} | resource: {self.path} | HTTP Verb {self.command}",
+            "Incoming request | #%s | resource: %s | HTTP Verb %s", self.request_num, self.path, self.command,
             extra={"request_num": self.request_num},
         )
 
@@ -145,135 +876,172 @@ class SimpleHandler(BaseHTTPRequestHandler):
         except Exception as exc:
             msg = f"Server encountered an unexpected error ! message: {str(exc)}"
             REQUEST_LOGGER.error(msg, extra={"request_num": self.request_num})
-            self._set_json(500)
-            self.wfile.write(json.dumps({"errorMessage": msg}).encode())
+            if self._streaming:
+                # the status line is already out; dropping the connection is all that is left
+                self.close_connection = True
+            else:
+                self._send_json({"errorMessage": msg}, 500)
         finally:
-            duration_ms = int((time.perf_counter() - start) * 1000)
-            REQUEST_LOGGER.debug(
-                f"request #{self.request_num} duration: {duration_ms}ms",
-                extra={"request_num": self.request_num},
-            )
-
-    def do_GET(self):
-        self._handle_request(self._do_GET_impl)
-
-    def do_POST(self):
-        self._handle_request(self._do_POST_impl)
-
-    def do_PUT(self):
-        self._handle_request(self._do_PUT_impl)
+            if not self._finish_deferred:
+                self._finish_request()
+
+    def _finish_request(self):
+        """Records the request's latency; for an engine that streams the body after
+        the handler returns (_finish_deferred), once the last chunk is written."""
+        elapsed = time.perf_counter() - self._start
+        route = self._route_path if self._route_path in ALLOWED_METHODS else "unmatched"
+        self.app.metrics.observe(route, self.command, self.status, elapsed)
+        duration_ms = int(elapsed * 1000)
+        REQUEST_LOGGER.debug(
+            "request #%s duration: %sms", self.request_num, duration_ms,
+            extra={"request_num": self.request_num},
+        )
 
-    def do_DELETE(self):
-        self._handle_request(self._do_DELETE_impl)
+    def _not_found(self):
+        self._write_response(404, NOT_FOUND_RESPONSE)
 
-    def _do_GET_impl(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
-        qs = parse_qs(parsed.query)
+    def _method_not_allowed(self):
+        self._write_response(405, METHOD_NOT_ALLOWED_RESPONSES[self._route_path])
 
-        if path == "/calculator/health":
-            self._set_text(200)
-            self.wfile.write(b"OK")
-            return
+    def _health(self):
+        self._write_response(200, HEALTH_RESPONSE)
 
-        if path == "/calculator/stack/size":
-            STACK_LOGGER.info(
-                f"Stack size is {len(stack)}",
-                extra={"request_num": self.request_num},
-            )
+    def _stack_size(self):
+        # copying the stack for the DEBUG line is O(n); only pay for it when it is logged
+        dump = STACK_LOGGER.isEnabledFor(logging.DEBUG)
+        size, snapshot, version = self._state("size", dump)
+        STACK_LOGGER.info(
+            "Stack size is %s", size,
+            extra={"request_num": self.request_num},
+        )
+        if dump:
             STACK_LOGGER.debug(
-                f"Stack content (first == top): [{', '.join(map(str, reversed(stack)))}]",
+                "Stack content (first == top): [%s]", _Joined(snapshot),
                 extra={"request_num": self.request_num},
             )
-            self._set_json()
-            self.wfile.write(json.dumps({"result": len(stack)}).encode())
+        etag = _etag(version)
+        if not self._not_modified(etag):
+            body = b'{"result": %d}' % size
+            self._write_response(200, _response_tail(JSON_TYPE, body, [("ETag", etag)]))
+
+    def _stack_operate(self):
+        operation = self._param("operation")
+        registered = OPERATIONS.get(operation)
+        if registered is None:
+            msg = f"Error: unknown operation: {operation}"
+            self._fail_stack(msg)
             return
 
-        if path == "/calculator/stack/operate":
-            operation = qs.get("operation", [None])[0]
-            if not operation or operation.lower() not in OPERATIONS:
-                msg = f"Error: unknown operation: {operation}"
-                self._fail_stack(msg)
-                return
+        # pop-compute-push is one state operation, so it is atomic with respect to other workers
+        error, result, args, size = self._state("operate", operation, registered.arity)
+        if error:
+            self._fail_stack(error)
+            return
 
-            arg_cnt = OPERATIONS[operation.lower()][0]
-            if len(stack) < arg_cnt:
-                msg = (f"Error: cannot implement operation {operation}. "
-                       f"It requires {arg_cnt} arguments and the stack has only {len(stack)} arguments")
-                self._fail_stack(msg)
-                return
+        STACK_LOGGER.info(
+            "Performing operation %s. Result is %s | stack size: %s", operation, result, size,
+            extra={"request_num": self.request_num},
+        )
+        STACK_LOGGER.debug(
+            "Performing operation: %s(%s) = %s", operation, _Joined(args), result,
+            extra={"request_num": self.request_num},
+        )
+        self._send_result(result)
 
-            args = [stack.pop() for _ in range(arg_cnt)]
-            result, error, code = perform_operation(operation, args)
-            if error:
-                for v in reversed(args):
-                    stack.append(v)
-                self._fail_stack(error)
-                return
+    def _history(self):
+        flavor = self._param("flavor")
+        operation = self._param("operation")
+        try:
+            offset = int(self._param("offset", "0"))
+            limit = self._param("limit")
+            limit = None if limit is None else int(limit)
+            cursor = self._param("cursor")
+            cursor = None if cursor is None else int(cursor)
+        except ValueError:
+            self._fail("Error: offset, limit and cursor must be integers", 400)
+            return
+        if offset < 0 or (limit is not None and limit < 0):
+            self._fail("Error: offset and limit must not be negative", 400)
+            return
+
+        # the session version tags the response: a client that has it gets 304,
+        # and an unchanged history is served from the cache without being read
+        version, totals = self._state("version")
+        if self._not_modified(_etag(version)):
+            self._log_history_totals(flavor, *totals)
+            return
+        key = (self.session_name, self._route_path, self._raw_query)
+        cached = self.app.responses.get(key, version)
+        if cached is not None:
+            tail, totals = cached
+            self._log_history_totals(flavor, *totals)
+            self._write_response(200, tail)
+            return
 
-            history.append({"flavor": "STACK", "operation": operation,
-                            "arguments": args, "result": result})
+        flavor_filter = flavor if flavor in ("STACK", "INDEPENDENT") else None
+        page, next_cursor, upto, totals, version = self._state(
+            "history", flavor_filter, operation, offset,
+            STREAM_PAGE if limit is None or limit > STREAM_PAGE else limit, cursor, None, True,
+        )
+        self._log_history_totals(flavor, *totals)
+
+        etag = _etag(version)
+        with_cursor = limit is not None or cursor is not None
+        if next_cursor is not None and (limit is None or limit > len(page)):
+            # more than one page: stream the rest as it is read
+            self._send_stream(_history_chunks(self._state, page, next_cursor, flavor_filter, operation,
+                                              None if limit is None else limit - len(page), upto, with_cursor),
+                              etag)
+            return
+        response = {"result": page}
+        if with_cursor:
+            response["nextCursor"] = next_cursor
+        tail = _response_tail(JSON_TYPE, dumps_bytes(response), [("ETag", etag)])
+        self.app.responses.put(key, version, tail, totals)
+        self._write_response(200, tail)
+
+    def _log_history_totals(self, flavor, stack_actions, indep_actions):
+        if flavor == "STACK" or flavor is None:
             STACK_LOGGER.info(
-                f"Performing operation {operation}. Result is {result} | stack size: {len(stack)}",
+                "History: So far total %s stack actions", stack_actions,
                 extra={"request_num": self.request_num},
             )
-            STACK_LOGGER.debug(
-                f"Performing operation: {operation}({', '.join(map(str, args))}) = {result}",
+        if flavor == "INDEPENDENT" or flavor is None:
+            INDEPENDENT_LOGGER.info(
+                "History: So far total %s independent actions", indep_actions,
                 extra={"request_num": self.request_num},
             )
-            self._set_json()
-            self.wfile.write(json.dumps({"result": result}).encode())
-            return
 
-        if path == "/calculator/history":
-            flavor = qs.get("flavor", [None])[0]
-            if flavor == "STACK":
-                filtered = [h for h in history if h["flavor"] == "STACK"]
-            elif flavor == "INDEPENDENT":
-                filtered = [h for h in history if h["flavor"] == "INDEPENDENT"]
-            else:
-                filtered = history
-
-            if flavor == "STACK" or flavor is None:
-                stack_actions = len([h for h in history if h["flavor"] == "STACK"])
-                STACK_LOGGER.info(
-                    f"History: So far total {stack_actions} stack actions",
-                    extra={"request_num": self.request_num},
-                )
-            if flavor == "INDEPENDENT" or flavor is None:
-                indep_actions = len([h for h in history if h["flavor"] == "INDEPENDENT"])
-                INDEPENDENT_LOGGER.info(
-                    f"History: So far total {indep_actions} independent actions",
-                    extra={"request_num": self.request_num},
-                )
-
-            self._set_json()
-            self.wfile.write(json.dumps({"result": filtered}).encode())
-            return
-
-        if path == "/logs/level":
-            logger_name = qs.get("logger-name", [None])[0]
-            logger = ALL_LOGGERS.get(logger_name)
-            if not logger:
-                self._set_text(404)
-                self.wfile.write(f"Logger '{logger_name}' not found".encode())
-                return
-            level_name = logging.getLevelName(logger.level)
-            self._set_text(200)
-            self.wfile.write(level_name.encode())
-            return
-
-        self._set_json(404)
-        self.wfile.write(json.dumps({"errorMessage": "Not Found"}).encode())
-
-    def _do_POST_impl(self):
-        if self.path != "/calculator/independent/calculate":
-            self._set_json(404)
-            self.wfile.write(json.dumps({"errorMessage": "Not Found"}).encode())
+    def _stack_dump(self):
+        snapshot = self._state("dump", STREAM_PAGE)
+        size = len(snapshot)
+        STACK_LOGGER.info(
+            "Stack content requested | Stack size: %s", size,
+            extra={"request_num": self.request_num},
+        )
+        if isinstance(snapshot, list):
+            self._send_json({"result": snapshot})
+        else:
+            self._send_stream(_list_chunks(snapshot.chunks(STREAM_PAGE)))
+
+    def _metrics(self):
+        self._write_response(200, _response_tail(METRICS_TYPE, self.app.metrics.render().encode()))
+
+    def _get_log_level(self):
+        logger_name = self._param("logger-name")
+        logger = ALL_LOGGERS.get(logger_name)
+        if not logger:
+            self._send_text(f"Logger '{logger_name}' not found", 404)
             return
+        level_name = logging.getLevelName(logger.level)
+        # the level is the whole representation, so it is its own version
+        etag = _etag(level_name)
+        if not self._not_modified(etag):
+            self._write_response(200, _response_tail(TEXT_TYPE, level_name.encode(), [("ETag", etag)]))
 
+    def _independent_calculate(self):
         length = int(self.headers.get("Content-Length", 0))
-        data = json.loads(self.rfile.read(length))
+        data = loads_bytes(self.rfile.read(length))
         operation = data.get("operation")
         args = data.get("arguments", [])
 
@@ -282,111 +1050,788 @@ class SimpleHandler(BaseHTTPRequestHandler):
             self._fail_independent(error, code)
             return
 
-        history.append({"flavor": "INDEPENDENT", "operation": operation,
-                        "arguments": args, "result": result})
+        entry = {"flavor": "INDEPENDENT", "operation": operation,
+                 "arguments": args, "result": result}
+        self._state("record", [entry])
         INDEPENDENT_LOGGER.info(
-            f"Performing operation {operation}. Result is {result}",
+            "Performing operation %s. Result is %s", operation, result,
             extra={"request_num": self.request_num},
         )
         INDEPENDENT_LOGGER.debug(
-            f"Performing operation: {operation}({', '.join(map(str, args))}) = {result}",
+            "Performing operation: %s(%s) = %s", operation, _Joined(args), result,
             extra={"request_num": self.request_num},
         )
-        self._set_json()
-        self.wfile.write(json.dumps({"result": result}).encode())
-
-    def _do_PUT_impl(self):
-        if self.path == "/calculator/stack/arguments":
-            length = int(self.headers.get("Content-Length", 0))
-            data = json.loads(self.rfile.read(length))
-            args = data.get("arguments", [])
+        self._send_result(result)
 
-            size_before = len(stack)
-            stack.extend(args)
-            STACK_LOGGER.info(
-                f"Adding total of {len(args)} argument(s) to the stack | Stack size: {len(stack)}",
-                extra={"request_num": self.request_num},
-            )
-            STACK_LOGGER.debug(
-                f"Adding arguments: {', '.join(map(str, args))} | Stack size before {size_before} | stack size after {len(stack)}",
-                extra={"request_num": self.request_num},
-            )
-            self._set_json()
-            self.wfile.write(json.dumps({"result": len(stack)}).encode())
+    def _independent_batch(self):
+        length = int(self.headers.get("Content-Length", 0))
+        items = loads_bytes(self.rfile.read(length))
+        if not isinstance(items, list):
+            self._fail_independent("Error: batch body must be a JSON array of {operation, arguments} objects", 400)
+            return
+        too_many = self.app.admission.check_arguments(len(items))
+        if too_many:
+            self._fail_independent(too_many, 413)
             return
 
-        if self.path.startswith("/logs/level"):
-            parsed = urlparse(self.path)
-            qs = parse_qs(parsed.query)
-            logger_name = qs.get("logger-name", [None])[0]
-            logger_level = qs.get("logger-level", [None])[0]
+        entries = []
+        results = _run_batch(items, entries)
+        if len(items) <= BATCH_STREAM_THRESHOLD:
+            response = {"result": list(results)}
+            self._state("record", entries)
+            self._send_json(response)
+            self._log_batch(len(items), len(entries))
+        else:
+            self._send_stream(self._batch_chunks(results, entries, len(items)))
+
+    def _log_batch(self, count, succeeded):
+        INDEPENDENT_LOGGER.info(
+            "Performing batch of %s operation(s). %s succeeded, %s failed",
+            count, succeeded, count - succeeded,
+            extra={"request_num": self.request_num},
+        )
 
-            logger = ALL_LOGGERS.get(logger_name)
-            if logger is None:
-                self._set_text(404)
-                self.wfile.write(f"Logger '{logger_name}' not found".encode())
-                return
-            if logger_level not in {"ERROR", "INFO", "DEBUG"}:
-                self._set_text(400)
-                self.wfile.write("Invalid logger level".encode())
-                return
+    def _batch_chunks(self, results, entries, count):
+        # the asyncio engine drains this after the handler has returned, so the summary is logged here
+        yield b'{"result": ['
+        chunk = []
+        separator = b""
+        for outcome in results:
+            chunk.append(dumps_bytes(outcome))
+            if len(chunk) == BATCH_STREAM_CHUNK:
+                yield separator + b", ".join(chunk)
+                separator = b", "
+                chunk = []
+        if chunk:
+            yield separator + b", ".join(chunk)
+        self._state("record", entries)
+        self._log_batch(count, len(entries))
+        yield b"]}"
+
+    def _stack_push(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = loads_bytes(self.rfile.read(length))
+        args = data.get("arguments", [])
+        too_many = self.app.admission.check_arguments(len(args)) if isinstance(args, list) else None
+        if too_many:
+            self._fail_stack(too_many, 413)
+            return
+        try:
+            args = IntStack.convert(args)
+        except ValueError as exc:
+            self._fail_stack(str(exc))
+            return
+
+        size_before, size = self._state("push", args)
+        STACK_LOGGER.info(
+            "Adding total of %s argument(s) to the stack | Stack size: %s", len(args), size,
+            extra={"request_num": self.request_num},
+        )
+        STACK_LOGGER.debug(
+            "Adding arguments: %s | Stack size before %s | stack size after %s", _Joined(args), size_before, size,
+            extra={"request_num": self.request_num},
+        )
+        self._send_result(size)
 
-            logger.setLevel(getattr(logging, logger_level))
-            self._set_text(200)
-            self.wfile.write(logger_level.encode())
+    def _stack_program(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = loads_bytes(self.rfile.read(length))
+        if not isinstance(data, dict):
+            self._fail_stack("Error: program body must be an object with a program list", 400)
+            return
+        scratch = bool(data.get("scratch", False))
+        try:
+            program = PROGRAMS.get(data.get("program"))
+        except ProgramError as exc:
+            self._fail_stack(str(exc))
             return
 
-        self._set_json(404)
-        self.wfile.write(json.dumps({"errorMessage": "Not Found"}).encode())
+        error, result, steps, size = self._state("program", program, scratch)
+        if error:
+            self._fail_stack(error)
+            return
 
-    def _do_DELETE_impl(self):
-        parsed = urlparse(self.path)
-        if parsed.path != "/calculator/stack/arguments":
-            self._set_json(404)
-            self.wfile.write(json.dumps({"errorMessage": "Not Found"}).encode())
+        STACK_LOGGER.info(
+            "Running program of %s operation(s). Result is %s | stack size: %s", len(steps), result, size,
+            extra={"request_num": self.request_num},
+        )
+        if STACK_LOGGER.isEnabledFor(logging.DEBUG):
+            for name, args, value in steps:
+                STACK_LOGGER.debug(
+                    "Performing operation: %s(%s) = %s", name, _Joined(args), value,
+                    extra={"request_num": self.request_num},
+                )
+        if data.get("steps"):
+            self._send_json({"result": result, "steps": [value for _, _, value in steps]})
+        else:
+            self._send_result(result)
+
+    def _set_log_level(self):
+        logger_name = self._param("logger-name")
+        logger_level = self._param("logger-level")
+
+        logger = ALL_LOGGERS.get(logger_name)
+        if logger is None:
+            self._send_text(f"Logger '{logger_name}' not found", 404)
+            return
+        if logger_level not in {"ERROR", "INFO", "DEBUG"}:
+            self._send_text("Invalid logger level", 400)
             return
 
-        qs = parse_qs(parsed.query)
-        count = int(qs.get("count", ["0"])[0])
-        if count > len(stack):
-            msg = f"Error: cannot remove {count} from the stack. It has only {len(stack)} arguments"
+        self.app.state.set_log_level(logger_name, getattr(logging, logger_level))
+        self._send_text(logger_level)
+
+    def _stack_remove(self):
+        count = int(self._param("count", "0"))
+        msg, size = self._state("remove", count)
+        if msg:
             self._fail_stack(msg)
             return
 
-        for _ in range(count):
-            stack.pop()
         STACK_LOGGER.info(
-            f"Removing total {count} argument(s) from the stack | Stack size: {len(stack)}",
+            "Removing total %s argument(s) from the stack | Stack size: %s", count, size,
             extra={"request_num": self.request_num},
         )
-        self._set_json()
-        self.wfile.write(json.dumps({"result": len(stack)}).encode())
+        self._send_result(size)
+
+    def _fail(self, msg, code):
+        REQUEST_LOGGER.error(
+            "Server encountered an error ! message: %s", msg,
+            extra={"request_num": self.request_num},
+        )
+        self._send_json({"errorMessage": msg}, code)
 
     def _fail_stack(self, msg, code=409):
         STACK_LOGGER.error(
-            f"Server encountered an error ! message: {msg}",
+            "Server encountered an error ! message: %s", msg,
             extra={"request_num": self.request_num},
         )
-        self._set_json(code)
-        self.wfile.write(json.dumps({"errorMessage": msg}).encode())
+        self._send_json({"errorMessage": msg}, code)
 
     def _fail_independent(self, msg, code=409):
         INDEPENDENT_LOGGER.error(
-            f"Server encountered an error ! message: {msg}",
+            "Server encountered an error ! message: %s", msg,
             extra={"request_num": self.request_num},
         )
-        self._set_json(code)
-        self.wfile.write(json.dumps({"errorMessage": msg}).encode())
+        self._send_json({"errorMessage": msg}, code)
+
+
+def _history_chunks(state, first, cursor, flavor, operation, remaining, upto, with_cursor):
+    """Yields a history response page by page, reading each with ``state("history", ...)``.
+
+    Entries recorded after ``upto`` (the newest one when the request came in)
+    are left out, so the response does not chase a history that keeps growing.
+    """
+    yield b'{"result": [' + b", ".join(map(dumps_bytes, first))
+    next_cursor = cursor
+    while cursor is not None and (remaining is None or remaining > 0):
+        size = STREAM_PAGE if remaining is None else min(remaining, STREAM_PAGE)
+        page, cursor, _, _, _ = state("history", flavor, operation, 0, size, cursor, upto, False)
+        if not page:
+            break
+        next_cursor = cursor
+        if remaining is not None:
+            remaining -= len(page)
+        yield b", " + b", ".join(map(dumps_bytes, page))
+    yield b'], "nextCursor": ' + dumps_bytes(next_cursor) + b"}" if with_cursor else b"]}"
+
+
+def _list_chunks(chunks):
+    """Yields ``{"result": [...]}`` for a list that arrives in pieces."""
+    yield b'{"result": ['
+    separator = b""
+    for values in chunks:
+        yield separator + b", ".join(map(dumps_bytes, values))
+        separator = b", "
+    yield b"]}"
+
+
+def _run_batch(items, entries):
+    """Yields the response object for every batch item; successful ones are added to entries."""
+    for item in items:
+        if not isinstance(item, dict):
+            yield {"errorMessage": "Error: batch items must be objects with operation and arguments"}
+            continue
+        operation = item.get("operation")
+        args = item.get("arguments", [])
+        if not isinstance(operation, str):
+            yield {"errorMessage": f"Error: unknown operation: {operation}"}
+            continue
+        if not isinstance(args, list):
+            yield {"errorMessage": "Error: arguments must be a list"}
+            continue
+        try:
+            result, error, code = perform_operation(operation, args)
+        except Exception as exc:  # one bad item must not cut off the rest, possibly mid-stream
+            error = f"Error while performing operation {operation}: {exc}"
+        if error:
+            yield {"errorMessage": error}
+            continue
+        entries.append({"flavor": "INDEPENDENT", "operation": operation,
+                        "arguments": args, "result": result})
+        yield {"result": result}
+
+
+# ROUTES compiled once into plain functions, plus the Allow header value per known path.
+_DISPATCH = {key: getattr(CalculatorRoutes, name) for key, name in ROUTES.items()}
+ALLOWED_METHODS = {path: ", ".join(m for m, p in ROUTES if p == path) for _, path in ROUTES}
+METHOD_NOT_ALLOWED_RESPONSES = {
+    path: _response_tail(JSON_TYPE, dumps_bytes({"errorMessage": "Method Not Allowed"}), [("Allow", allowed)])
+    for path, allowed in ALLOWED_METHODS.items()
+}
+
+
+def resolve_route(command, target):
+    """Maps a request line to (handler function, raw query string) with one dict lookup."""
+    path, _, query = target.partition("?")
+    handler = _DISPATCH.get((command, path))
+    if handler is None:
+        handler = (CalculatorRoutes._method_not_allowed if path in ALLOWED_METHODS
+                   else CalculatorRoutes._not_found)
+    return handler, query
+
+
+class SimpleHandler(CalculatorRoutes, BaseHTTPRequestHandler):
+    def setup(self):
+        self.app = self.server.app
+        super().setup()
+
+    def _write_response(self, code, tail):
+        """Sends status line, headers and body with a single write."""
+        self.status = code
+        self.log_request(code)
+        head = _status_line(self.protocol_version, code) + _http_date() + self._server_header()
+        if self.close_connection and self.protocol_version != "HTTP/1.0":
+            head += b"Connection: close\r\n"
+        self.wfile.write(head + tail)
+
+    def _send_stream(self, chunks, etag=None):
+        self.status = 200
+        self._streaming = True
+        chunked = self.protocol_version == "HTTP/1.1" and self.request_version != "HTTP/1.0"
+        self.log_request(200)
+        head = _status_line(self.protocol_version, 200) + _http_date() + self._server_header() + _etag_header(etag)
+        if not chunked:
+            self.close_connection = True
+            self.wfile.write(head + b"Content-Type: application/json\r\nConnection: close\r\n\r\n")
+            for chunk in chunks:
+                self.wfile.write(chunk)
+            return
+        if self.close_connection:
+            head += b"Connection: close\r\n"
+        self.wfile.write(head + STREAM_HEADERS)
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(_chunk(chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _server_header(self):
+        cls = type(self)
+        header = cls.__dict__.get("_server_header_line")
+        if header is None:
+            header = f"Server: {self.version_string()}\r\n".encode()
+            cls._server_header_line = header
+        return header
+
+    def _admit_and_dispatch(self):
+        """dispatch() with the whole body read, unless admission control turns
+        the request away first, in which case its body is never read."""
+        admission = self.app.admission
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        rejection = (400, "Invalid Content-Length", None) if length < 0 else admission.admit(
+            self.client_address[0], length)
+        if rejection is not None:
+            code, message, retry_after = rejection
+            self.close_connection = True  # the unread body must not be taken for the next request
+            self._write_response(code, _rejection_tail(message, retry_after))
+            return
+        connection = self.rfile
+        try:
+            # read up front, as the asyncio engine does: a body a route ignores
+            # (a 404, a GET) must not be parsed as the next keep-alive request
+            body = connection.read(length) if length else b""
+            if len(body) < length:
+                self.close_connection = True  # the client went away mid-body
+                return
+            self.rfile = io.BytesIO(body)
+            self.dispatch()
+        finally:
+            self.rfile = connection
+            admission.release()
+
+    def do_GET(self):
+        self._admit_and_dispatch()
+
+    def do_POST(self):
+        self._admit_and_dispatch()
+
+    def do_PUT(self):
+        self._admit_and_dispatch()
+
+    def do_DELETE(self):
+        self._admit_and_dispatch()
+
+
+class KeepAliveHandler(SimpleHandler):
+    """SimpleHandler speaking HTTP/1.1: a connection serves requests until the client
+    closes it or stays idle for ``timeout`` seconds.  Used with the worker pool, where
+    an idle connection only ties up its own worker."""
+
+    protocol_version = "HTTP/1.1"
+    timeout = 30
+
+
+# ---------- servers ----------
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands every accepted connection to a bounded pool of worker threads.
+
+    At most ``workers`` connections are handled at once and at most ``max_pending``
+    more wait in the pool queue; beyond that the accept loop blocks, so the kernel
+    backlog absorbs the overload instead of an ever growing thread count.
+
+    server_close() shuts down the reading side of every open connection first,
+    so workers waiting on idle keep-alive clients return at once instead of
+    after KeepAliveHandler.timeout, while responses being written still finish.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=8, max_pending=None):
+        from concurrent.futures import ThreadPoolExecutor
+
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calc-worker")
+        self._slots = threading.BoundedSemaphore(workers + (workers if max_pending is None else max_pending))
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        with self._connections_lock:
+            self._connections.add(request)
+        try:
+            self._pool.submit(self._process_in_worker, request, client_address)
+        except Exception:
+            self._forget(request)
+            self._slots.release()
+            self.shutdown_request(request)
+            raise
+
+    def _process_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self._forget(request)
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _forget(self, request):
+        with self._connections_lock:
+            self._connections.discard(request)
+
+    def server_close(self):
+        super().server_close()
+        with self._connections_lock:
+            connections = list(self._connections)
+        for request in connections:
+            try:
+                request.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass  # already closed by its worker
+        self._pool.shutdown(wait=True)
+
+
+SERVER_MODES = ("single", "threaded", "asyncio", "prefork")
+
+
+def make_server(port=8496, mode="single", workers=8, host="", app=None):
+    """Builds (but does not start) a server for the given serving mode, serving
+    ``app`` (a new one from create_app() by default) as ``server.app``.
+
+    The asyncio engine has no socketserver object; start it with start_async_server(),
+    and prefork mode is a process tree started with run_prefork().
+    """
+    if mode == "single":
+        server = HTTPServer((host, port), SimpleHandler)
+    elif mode == "threaded":
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        server = PooledHTTPServer((host, port), KeepAliveHandler, workers=workers)
+    else:
+        raise ValueError(f"unknown serving mode: {mode}")
+    server.app = create_app() if app is None else app
+    return server
+
+
+# ---------- asyncio engine ----------
+class _Headers(dict):
+    """Request headers keyed by lower-cased name, with a case-insensitive get()."""
+
+    def get(self, name, default=None):
+        return dict.get(self, name.lower(), default)
+
+
+class AsyncRequest(CalculatorRoutes):
+    """A single request read off an asyncio connection.
+
+    The response is buffered in memory so the engine can frame it with a
+    Content-Length header, which is what makes keep-alive possible.  Streamed
+    responses keep only their chunk generator, which _serve_connection drains
+    onto the socket.
+    """
+
+    def __init__(self, app, command, path, headers, body, client_address=None):
+        self.app = app
+        self.command = command
+        self.path = path
+        self.headers = headers
+        self.client_address = client_address
+        self.rfile = io.BytesIO(body)
+        self.status = 500
+        self.chunks = None
+        self._etag = None
+        self._tail = None
+
+    def _write_response(self, code, tail):
+        # a second call (e.g. the 500 fallback in _handle_request) replaces the response
+        self.status = code
+        self._tail = tail
+
+    def _send_stream(self, chunks, etag=None):
+        self.status = 200
+        self.chunks = chunks
+        self._etag = etag
+        self._finish_deferred = True  # _serve_connection finishes it once the chunks are written
+
+    def render(self, keep_alive, chunked=True):
+        head = (_status_line("HTTP/1.1", self.status) + _http_date()
+                + (b"Connection: keep-alive\r\n" if keep_alive else b"Connection: close\r\n"))
+        if self.chunks is None:
+            return head + self._tail
+        head += _etag_header(self._etag)
+        return head + STREAM_HEADERS if chunked else head + b"Content-Type: application/json\r\n\r\n"
+
+
+def _simple_response(code, message, retry_after=None):
+    return _status_line("HTTP/1.1", code) + b"Connection: close\r\n" + _rejection_tail(message, retry_after)
+
+
+async def _serve_connection(app, reader, writer, keepalive_timeout):
+    import asyncio  # already loaded by whoever runs the loop
+
+    peer = writer.get_extra_info("peername")
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), keepalive_timeout)
+            except asyncio.LimitOverrunError:
+                writer.write(_simple_response(431, "Request header fields too large"))
+                break
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                break
+
+            lines = head[:-4].decode("latin-1").split("\r\n")
+            parts = lines[0].split()
+            if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+                writer.write(_simple_response(400, f"Bad request syntax ({lines[0]!r})"))
+                break
+            command, path, version = parts
+            headers = _Headers()
+            for line in lines[1:]:
+                name, sep, value = line.partition(":")
+                if not sep:
+                    continue
+                headers[name.strip().lower()] = value.strip()
+
+            if "transfer-encoding" in headers:
+                writer.write(_simple_response(501, "Chunked request bodies are not supported"))
+                break
+            try:
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                length = -1
+            if length < 0:
+                writer.write(_simple_response(400, "Invalid Content-Length"))
+                break
+            # turned away before the body is read; the connection goes with it
+            rejection = app.admission.admit(peer[0] if peer else None, length)
+            if rejection is not None:
+                writer.write(_simple_response(*rejection))
+                break
+            try:
+                body = await reader.readexactly(length) if length > 0 else b""
+
+                connection = headers.get("connection", "").lower()
+                if version == "HTTP/1.1":
+                    keep_alive = connection != "close"
+                else:
+                    keep_alive = connection == "keep-alive"
+
+                if command not in SUPPORTED_METHODS:
+                    writer.write(_simple_response(501, f"Unsupported method ({command!r})"))
+                    break
+                request = AsyncRequest(app, command, path, headers, body, peer)
+                if ENGINE.pool_size > 0:
+                    # an offloaded operation blocks its caller for up to ENGINE.timeout; not the loop
+                    await asyncio.get_running_loop().run_in_executor(None, request.dispatch)
+                else:
+                    request.dispatch()
+                # pipelined requests are answered in order, one after the other
+                if request.chunks is None:
+                    writer.write(request.render(keep_alive))
+                else:
+                    try:
+                        keep_alive = await _write_stream(writer, request, keep_alive, version == "HTTP/1.1")
+                    finally:
+                        request._finish_request()
+                    if not keep_alive:
+                        break
+                await writer.drain()
+            finally:
+                app.admission.release()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _write_stream(writer, request, keep_alive, chunked):
+    """Writes a streamed response, draining after every chunk; False if it was cut short."""
+    import asyncio  # already loaded by whoever runs the loop
+
+    if not chunked:
+        keep_alive = False  # HTTP/1.0: the end of the body is the end of the connection
+    writer.write(request.render(keep_alive, chunked))
+    # chunk generators may compute (a streamed batch); with the pool on that can mean
+    # waiting for an offloaded operation, so they are then advanced off the loop too
+    loop = asyncio.get_running_loop() if ENGINE.pool_size > 0 else None
+    chunks = iter(request.chunks)
+    try:
+        while (chunk := next(chunks, None) if loop is None
+               else await loop.run_in_executor(None, next, chunks, None)) is not None:
+            if chunk:
+                writer.write(_chunk(chunk) if chunked else chunk)
+                await writer.drain()
+    except Exception as exc:
+        REQUEST_LOGGER.error(
+            "Server encountered an unexpected error ! message: %s", exc,
+            extra={"request_num": request.request_num},
+        )
+        return False
+    if chunked:
+        writer.write(b"0\r\n\r\n")
+    return keep_alive
+
+
+async def start_async_server(port=8496, host="", keepalive_timeout=60.0, backlog=1024, app=None):
+    """Starts the asyncio engine on the running loop and returns the asyncio.Server.
+
+    Route handlers run on the event loop itself, so one connection costs a few
+    kilobytes of buffers rather than a thread.  With the process pool enabled
+    (ENGINE.pool_size) they run in the loop's default thread pool instead, so
+    waiting for an offloaded operation does not stall every other connection.  ``app`` is as for make_server().
+    """
+    import asyncio
+
+    app = create_app() if app is None else app
+    return await asyncio.start_server(
+        lambda r, w: _serve_connection(app, r, w, keepalive_timeout),
+        host or None, port, backlog=backlog,
+    )
+
+
+async def _serve_async(port, host, app):
+    server = await start_async_server(port, host, app=app)
+    async with server:
+        await server.serve_forever()
 
 
 # ---------- bootstrap ----------
-def run(port=8496):
-    server = HTTPServer(("", port), SimpleHandler)
-    print(f"Serving on port {port}")
-    server.serve_forever()
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(0)
 
 
-if __name__ == "__main__":
-    run()
+def _after_fork():
+    # the async log writer threads did not survive the fork
+    if LOG_OPTIONS["mode"] == "async":
+        configure_logging()
+
+
+def _prefork_coordinator(app, listener, counter, setup):
+    from prefork import serve_calls
+
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    _after_fork()
+    app.state = LocalState(app, counter)
+    try:
+        if setup is not None:
+            setup(app)
+        serve_calls(listener, app.state.call)
+    finally:
+        ENGINE.shutdown()
+        app.close()
+        logging.shutdown()  # children leave with os._exit(), which skips the atexit flush
+
+
+def _prefork_worker(app, sock, client, counter, log_levels):
+    from prefork import REUSE_PORT
+
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    _after_fork()
+    app.state = RemoteState(client, counter, log_levels)
+    server = HTTPServer(sock.getsockname(), SimpleHandler, bind_and_activate=False)
+    server.app = app
+    if REUSE_PORT:
+        # a listening socket of our own; the kernel balances connections across the workers
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server.server_bind()
+        server.server_activate()
+        sock.close()
+    else:
+        server.socket.close()
+        server.socket = sock
+        server.server_address = sock.getsockname()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        ENGINE.shutdown()
+        logging.shutdown()
+
+
+def run_prefork(app, port=8496, processes=None, setup=None, host=""):
+    """Serves ``app`` from ``processes`` forked worker processes (default: one per CPU).
+
+    This process binds the port and supervises the others, forking them
+    again when they exit.  One child, the coordinator, owns the stack, history
+    and sessions and runs the state operations the workers send it over a
+    Unix socket; the workers parse and answer HTTP with SimpleHandler and do
+    independent calculations themselves.  Request numbers and logger levels
+    are kept in shared memory.  ``setup(app)`` runs in the coordinator before
+    it answers, again after a restart.
+    """
+    if not hasattr(os, "fork"):
+        raise SystemExit("prefork mode needs os.fork()")
+    # imported here: only this mode pays for multiprocessing
+    import shutil
+    import tempfile
+    from multiprocessing.connection import Listener
+
+    from prefork import REUSE_PORT, CoordinatorClient, SharedCounter, SharedSettings, Supervisor, listen_socket
+
+    processes = processes or os.cpu_count() or 1
+    sock = listen_socket(host, port)
+    counter = SharedCounter(app.state.request_count())
+    log_levels = SharedSettings(logger.level for logger in ALL_LOGGERS.values())
+    directory = tempfile.mkdtemp(prefix="calc-prefork-")
+    address = os.path.join(directory, "coordinator.sock")
+    authkey = os.urandom(32)
+    listener = Listener(address, "AF_UNIX", backlog=128, authkey=authkey)
+    client = CoordinatorClient(address, authkey)
+
+    supervisor = Supervisor()
+    supervisor.add("coordinator", lambda: _prefork_coordinator(app, listener, counter, setup))
+    for n in range(processes):
+        supervisor.add(f"worker {n}", lambda: _prefork_worker(app, sock, client, counter, log_levels))
+    print(f"Serving on port {sock.getsockname()[1]} (prefork, {processes} processes"
+          f"{', SO_REUSEPORT' if REUSE_PORT else ''})")
+    sys.stdout.flush()
+    try:
+        supervisor.run()
+    finally:
+        listener.close()
+        sock.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
 
+def run(port=8496, mode="single", workers=8, processes=None, setup=None, app=None):
+    """Serves ``app`` (a new one from create_app() by default) until interrupted.
 
+    ``setup(app)`` (restoring persisted state) runs first, in the process that
+    owns the state.
+    """
+    app = create_app() if app is None else app
+    # docker stop sends SIGTERM: unwind through the finally blocks below so the
+    # operation log and the queued log records are flushed before exiting
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    if mode == "prefork":
+        run_prefork(app, port, processes, setup)
+        return
+    if setup is not None:
+        setup(app)
+    if mode == "asyncio":
+        import asyncio
+
+        print(f"Serving on port {port} ({mode})")
+        try:
+            asyncio.run(_serve_async(port, "", app))
+        finally:
+            ENGINE.shutdown()
+            app.close()
+        return
+    server = make_server(port, mode, workers, app=app)
+    if mode == "threaded":
+        print(f"Serving on port {port} ({mode}, {workers} workers)")
+    else:
+        print(f"Serving on port {port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        ENGINE.shutdown()
+        app.close()
+
+
+def _parse_args(argv=None):
+    import argparse
+
+    from persistence import FSYNC_POLICIES
+
+    parser = argparse.ArgumentParser(description="Calculator HTTP server")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("CALC_PORT", 8496)))
+    parser.add_argument("--mode", choices=SERVER_MODES, default=os.environ.get("CALC_MODE", "single"),
+                        help="single: one request at a time; threaded: bounded worker pool; "
+                             "asyncio: event loop with HTTP/1.1 keep-alive; "
+                             "prefork: worker processes sharing the state through a coordinator")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("CALC_WORKERS", 8)),
+                        help="worker threads for --mode threaded")
+    parser.add_argument("--processes", type=int, default=int(os.environ.get("CALC_PROCESSES", 0)),
+                        help="worker processes for --mode prefork (0 = one per CPU)")
+    parser.add_argument("--history-size", type=int, default=int(os.environ.get("CALC_HISTORY_SIZE", 0)),
+                        help="keep only the newest N history entries (0 = unbounded)")
+    parser.add_argument("--data-dir", default=os.environ.get("CALC_DATA_DIR", ""),
+                        help="keep stack/history in a write-ahead log + snapshots in this directory")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default=os.environ.get("CALC_FSYNC", "interval"),
+                        help="always: fsync before answering; interval: every --fsync-interval-ms; none: leave it to the OS")
+    parser.add_argument("--fsync-interval-ms", type=float, default=float(os.environ.get("CALC_FSYNC_INTERVAL_MS", 50)))
+    parser.add_argument("--snapshot-every", type=int, default=int(os.environ.get("CALC_SNAPSHOT_EVERY", 1_000_000)),
+                        help="write a snapshot after this many logged changes")
+    parser.add_argument("--log-mode", choices=("sync", "async"), default=LOG_OPTIONS["mode"],
+                        help="async: write log files from a background thread in batches")
+    parser.add_argument("--log-overflow", choices=OVERFLOW_POLICIES, default=LOG_OPTIONS["overflow"],
+                        help="what a full async log queue does: block the request or drop the record")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    _args = _parse_args()
+    if (_args.log_mode, _args.log_overflow) != (LOG_OPTIONS["mode"], LOG_OPTIONS["overflow"]):
+        configure_logging(mode=_args.log_mode, overflow=_args.log_overflow)
+    _setup = None
+    if _args.data_dir:
+        def _setup(app):
+            started = time.perf_counter()
+            replayed = app.enable_persistence(_args.data_dir, _args.fsync, _args.fsync_interval_ms,
+                                              _args.snapshot_every)
+            print(f"Restored {len(app.stack)} stack item(s) and {len(app.history)} history entries "
+                  f"({replayed} log records replayed) in {time.perf_counter() - started:.2f}s")
+    run(_args.port, _args.mode, _args.workers, _args.processes, _setup, create_app(history_size=_args.history_size))
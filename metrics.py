@@ -0,0 +1,123 @@
+import itertools
+import threading
+from bisect import bisect_left
+
+# upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names, values):
+    pairs = ",".join('%s="%s"' % (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+                     for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestMetrics:
+    """In-process metrics registry rendered in the Prometheus text format.
+
+    Requests are recorded with begin() and observe(): a latency histogram with
+    fixed ``buckets`` per (route, method, status), from which the request
+    counters and the per-(route, method) histograms are summed when rendered,
+    and an in-flight gauge.  observe() takes one lock; begin() takes none.
+
+    Everything else is read when /metrics is scraped, from collectors added
+    with add_collector().
+    """
+
+    def __init__(self, prefix="calculator", buckets=BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._finished = 0
+        # next() on a count is atomic, so starting a request needs no lock; the
+        # in-flight gauge is started - finished.  Reading the count advances it,
+        # hence _peeks.
+        self._started = itertools.count()
+        self._peeks = 0
+        self.begin = self._started.__next__
+        self._collectors = []
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            started = next(self._started) - self._peeks
+            self._peeks += 1
+            return started - self._finished
+
+    def observe(self, route, method, status, seconds):
+        index = bisect_left(self.buckets, seconds)
+        key = (route, method, status)
+        lock = self._lock
+        lock.acquire()  # cheaper than a with block on this hot path
+        try:
+            self._finished += 1
+            histogram = self._latency.get(key)
+            if histogram is None:
+                # one slot per bucket, one for +Inf, then the sum
+                histogram = self._latency[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += seconds
+        finally:
+            lock.release()
+
+    def add_collector(self, name, kind, help_text, collect, labels=()):
+        """Adds a metric read at scrape time.
+
+        ``collect()`` returns the value, or with ``labels`` a dict mapping
+        label-value tuples to values.  ``kind`` is "gauge" or "counter".
+        """
+        self._collectors.append((f"{self.prefix}_{name}", kind, help_text, collect, tuple(labels)))
+
+    def render(self):
+        with self._lock:
+            by_status = {key: list(values) for key, values in self._latency.items()}
+        in_flight = self.in_flight
+        latency = {}
+        for (route, method, _), values in by_status.items():
+            merged = latency.get((route, method))
+            if merged is None:
+                latency[(route, method)] = values
+            else:
+                latency[(route, method)] = [a + b for a, b in zip(merged, values)]
+
+        name = f"{self.prefix}_requests_total"
+        lines = [f"# HELP {name} Requests served, by route, method and status.",
+                 f"# TYPE {name} counter"]
+        for key in sorted(by_status):
+            lines.append(f"{name}{_labels(('route', 'method', 'status'), key)} {sum(by_status[key][:-1])}")
+
+        name = f"{self.prefix}_request_duration_seconds"
+        lines += [f"# HELP {name} Time spent handling a request, by route and method.",
+                  f"# TYPE {name} histogram"]
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        for key in sorted(latency):
+            histogram = latency[key]
+            base = _labels(("route", "method"), key)[1:-1]
+            count = 0
+            for bound, observed in zip(bounds, histogram):
+                count += observed
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+            lines.append(f"{name}_sum{{{base}}} {_number(histogram[-1])}")
+            lines.append(f"{name}_count{{{base}}} {count}")
+
+        name = f"{self.prefix}_requests_in_flight"
+        lines += [f"# HELP {name} Requests being handled right now.",
+                  f"# TYPE {name} gauge",
+                  f"{name} {in_flight}"]
+
+        for name, kind, help_text, collect, labels in self._collectors:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            value = collect()
+            if labels:
+                for key in sorted(value):
+                    lines.append(f"{name}{_labels(labels, key)} {_number(value[key])}")
+            else:
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
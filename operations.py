@@ -0,0 +1,177 @@
+import importlib
+import math
+import operator
+
+_LOG10_2 = math.log10(2)
+_LN_10 = math.log(10)
+
+
+def digits(n):
+    """Upper bound on the number of decimal digits of an integer."""
+    return int(abs(n).bit_length() * _LOG10_2) + 1
+
+
+def _pow_digits(base, exp):
+    if exp <= 0 or abs(base) <= 1:
+        return 1
+    try:
+        return int(exp * math.log10(abs(base))) + 1
+    except OverflowError:  # an exponent beyond float range: no result could be that small
+        return math.inf
+
+
+def _fact_digits(n):
+    try:
+        return int(math.lgamma(n + 1) / _LN_10) + 1 if n > 1 else 1
+    except OverflowError:
+        return math.inf
+
+
+def _sum_digits(*args):
+    return max(map(digits, args)) + len(str(len(args)))
+
+
+def _no_zero_divisor(args):
+    return "division by 0" if args[1] == 0 else None
+
+
+def _not_negative(args):
+    return "not supported for the negative number" if args[0] < 0 else None
+
+
+def total(*args):
+    """sum() of the arguments; a module-level function so it can be sent to the process pool."""
+    return sum(args)
+
+
+class Operation:
+    """A calculator operation: ``func`` applied to ``arity`` arguments of ``argument_type``.
+
+    An ``arity`` of None takes any number of arguments, at least one; on the
+    stack that is all of it.  ``argument_type`` converts one client-supplied
+    argument, raising TypeError or ValueError for one it does not accept; it
+    has to produce ints, since those are what the stack holds and what
+    ComputeEngine sizes, so anything but int only narrows what is accepted.
+    Values popped off the stack are ints already and skip it.  ``check(args)``
+    returns the reason arguments are refused, or None, and ``digits(*args)``
+    estimates the decimal digits of the result in O(1), math.inf when that
+    overflows a float.  The estimate is the cost ComputeEngine refuses, caches
+    and offloads by.  ``title`` names the operation in check errors.
+    """
+
+    __slots__ = ("name", "arity", "func", "digits", "check", "title", "argument_type")
+
+    def __init__(self, name, arity, func, digits=None, check=None, title=None, argument_type=int):
+        self.name = name
+        self.arity = arity
+        self.argument_type = argument_type
+        self.func = func
+        self.digits = digits
+        self.check = check
+        self.title = title or name.capitalize()
+
+    def __repr__(self):
+        return f"Operation({self.name!r}, arity={self.arity!r})"
+
+    def apply(self, args, run=None, name=None):
+        """(result, error-msg, http-code) for ``args``, already a list of ints of the
+        right length, e.g. values popped off the stack.  ``run(operation, args)``
+        computes the result (ComputeEngine.run); ``name`` is the spelling the
+        client used, for error messages."""
+        if self.check is not None:
+            error = self.check(args)
+            if error:
+                return None, f"Error while performing operation {self.title}: {error}", 409
+        try:
+            result = self.func(*args) if run is None else run(self, args)
+        except Exception as exc:  # includes compute_engine.LimitExceeded
+            return None, f"Error while performing operation {name or self.name}: {str(exc)}", 409
+        return result, None, 200
+
+
+class Registry:
+    """Operations by name.
+
+    get() is case-insensitive, but the lower-case names clients normally send
+    cost one dict lookup; only other spellings pay for a lower().  Operations
+    are added with register(), directly or from a plugin module (see
+    load_plugins()), and handlers only ever go through the registry, so a new
+    operation needs no handler changes.
+    """
+
+    def __init__(self):
+        self._operations = {}
+
+    def __len__(self):
+        return len(self._operations)
+
+    def __iter__(self):
+        return iter(self._operations.values())
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def register(self, name, arity, func, digits=None, check=None, title=None, argument_type=int):
+        """Adds an operation; see Operation for the arguments.  Returns it."""
+        name = name.lower()
+        if name in self._operations:
+            raise ValueError(f"operation {name} is already registered")
+        if arity is not None and arity < 1:
+            raise ValueError(f"operation {name} must take at least one argument")
+        operation = self._operations[name] = Operation(name, arity, func, digits, check, title, argument_type)
+        return operation
+
+    def get(self, name):
+        """The Operation called ``name`` in any case, or None."""
+        try:
+            return self._operations.get(name) or self._operations.get(name.lower())
+        except (AttributeError, TypeError):  # not a string
+            return None
+
+    def perform(self, name, args, run=None):
+        """Executes an operation on client-supplied arguments and returns
+        (result, error-msg, http-code); see Operation.apply for ``run``."""
+        try:  # get(), inlined
+            operation = self._operations.get(name) or self._operations.get(name.lower())
+        except (AttributeError, TypeError):
+            operation = None
+        if operation is None:
+            return None, f"Error: unknown operation: {name}", 409
+
+        arity = operation.arity
+        if arity is None:
+            if not args:
+                return None, f"Error: Not enough arguments to perform the operation {name}", 409
+        elif len(args) != arity:
+            few = "Not enough" if len(args) < arity else "Too many"
+            return None, f"Error: {few} arguments to perform the operation {name}", 409
+
+        convert = operation.argument_type
+        try:
+            args = list(map(convert, args))
+        except (TypeError, ValueError, OverflowError) as exc:  # OverflowError: int(float("inf"))
+            if convert is int:
+                return None, "Error: Arguments must be numeric (integers)", 409
+            return None, f"Error: invalid argument for the operation {name}: {exc}", 409
+        return operation.apply(args, run, name)
+
+
+def load_plugins(modules, registry):
+    """Imports each named module and calls its ``register(registry)``."""
+    for module in modules:
+        importlib.import_module(module).register(registry)
+
+
+# the built-in operations; func must be a module-level callable so it can be sent to the process pool
+OPERATIONS = Registry()
+OPERATIONS.register("plus", 2, operator.add, lambda a, b: max(digits(a), digits(b)) + 1)
+OPERATIONS.register("minus", 2, operator.sub, lambda a, b: max(digits(a), digits(b)) + 1)
+OPERATIONS.register("times", 2, operator.mul, lambda a, b: digits(a) + digits(b))
+OPERATIONS.register("divide", 2, operator.floordiv, lambda a, b: digits(a), _no_zero_divisor)
+OPERATIONS.register("pow", 2, pow, _pow_digits)
+OPERATIONS.register("abs", 1, abs, digits)
+OPERATIONS.register("fact", 1, math.factorial, _fact_digits, _not_negative, "Factorial")
+OPERATIONS.register("gcd", 2, math.gcd, lambda a, b: max(digits(a), digits(b)))
+OPERATIONS.register("mod", 2, operator.mod, lambda a, b: digits(b), _no_zero_divisor)
+OPERATIONS.register("sqrt", 1, math.isqrt, lambda a: digits(a) // 2 + 1, _not_negative)
+OPERATIONS.register("sum", None, total, _sum_digits)
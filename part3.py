@@ -1,40 +1,19 @@
 import json
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from math import factorial
-import operator
 from urllib.parse import urlparse, parse_qs
 
+from compute_engine import ComputeEngine
+from operations import OPERATIONS
+from stack_store import IntStack
+
 stack = []
 history = []
 
-OPERATIONS = {
-    "plus": (2, operator.add),
-    "minus": (2, operator.sub),
-    "times": (2, operator.mul),
-    "divide": (2, lambda x, y: x // y),
-    "pow": (2, pow),
-    "abs": (1, abs),
-    "fact": (1, factorial)
-}
+# the same operations and operand/result limits as main.py, with its defaults
+ENGINE = ComputeEngine()
 
 def perform_operation(name, args):
-    op_key = name.lower()
-    if op_key not in OPERATIONS:
-        return None, f"Error: unknown operation: {name}", 409
-    expected_args, func = OPERATIONS[op_key]
-    if len(args) < expected_args:
-        return None, f"Error: Not enough arguments to perform the operation {name}", 409
-    if len(args) > expected_args:
-        return None, f"Error: Too many arguments to perform the operation {name}", 409
-    if op_key == "divide" and args[1] == 0:
-        return None, "Error while performing operation Divide: division by 0", 409
-    if op_key == "fact" and args[0] < 0:
-        return None, "Error while performing operation Factorial: not supported for the negative number", 409
-    try:
-        result = func(*args)
-        return result, None, 200
-    except Exception as e:
-        return None, str(e), 409
+    return OPERATIONS.perform(name, args, ENGINE.run)
 
 class SimpleHandler(BaseHTTPRequestHandler):
     def _set_headers(self, code=200):
@@ -57,23 +36,20 @@ class SimpleHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps({"result": len(stack)}).encode())
         elif path == "/calculator/stack/operate":
             operation = query.get("operation", [None])[0]
-            if not operation:
-                self._set_headers(409)
-                self.wfile.write(json.dumps({"errorMessage": "Error: unknown operation: None"}).encode())
-                return
-            op_key = operation.lower()
-            if op_key not in OPERATIONS:
+            registered = OPERATIONS.get(operation)
+            if registered is None:
                 self._set_headers(409)
                 self.wfile.write(json.dumps({"errorMessage": f"Error: unknown operation: {operation}"}).encode())
                 return
-            arg_count = OPERATIONS[op_key][0]
+            arg_count = registered.arity or max(len(stack), 1)
             if len(stack) < arg_count:
-                msg = f"Error: cannot implement operation {operation}. It requires {arg_count} arguments and the stack has only {len(stack)} arguments"
+                required = arg_count if registered.arity else "at least 1"
+                msg = f"Error: cannot implement operation {operation}. It requires {required} arguments and the stack has only {len(stack)} arguments"
                 self._set_headers(409)
                 self.wfile.write(json.dumps({"errorMessage": msg}).encode())
                 return
             args = [stack.pop() for _ in range(arg_count)]
-            result, error, code = perform_operation(operation, args)
+            result, error, code = registered.apply(args, ENGINE.run, operation)
             if error:
                 for v in reversed(args):
                     stack.append(v)
@@ -123,6 +99,12 @@ class SimpleHandler(BaseHTTPRequestHandler):
             body = self.rfile.read(content_len)
             data = json.loads(body)
             args = data.get("arguments", [])
+            try:
+                args = IntStack.convert(args)
+            except ValueError as exc:
+                self._set_headers(409)
+                self.wfile.write(json.dumps({"errorMessage": str(exc)}).encode())
+                return
             stack.extend(args)
             self._set_headers()
             self.wfile.write(json.dumps({"result": len(stack)}).encode())
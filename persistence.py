@@ -0,0 +1,236 @@
+import glob
+import json
+import os
+import pickle
+import threading
+import time
+
+FSYNC_POLICIES = ("always", "interval", "none")
+
+_ROTATE = object()
+
+
+def _segment_path(directory, number):
+    return os.path.join(directory, f"wal-{number:08d}.log")
+
+
+def _snapshot_path(directory, number):
+    return os.path.join(directory, f"snapshot-{number:08d}.pickle")
+
+
+def _numbers(directory, prefix, suffix):
+    found = []
+    for path in glob.glob(os.path.join(directory, f"{prefix}-*{suffix}")):
+        name = os.path.basename(path)[len(prefix) + 1:-len(suffix)]
+        if name.isdigit():
+            found.append(int(name))
+    return sorted(found)
+
+
+class Persistence:
+    """Append-only operation log with periodic snapshots.
+
+    Records are JSON lines appended to numbered log segments by a writer thread
+    that commits them in groups.  ``fsync`` decides durability:
+
+    * ``always``   - commit() returns only after the record is fsynced (records that
+                     arrive while one fsync is running share the next one);
+    * ``interval`` - the log is written and fsynced at most once per ``interval_ms``,
+                     however fast records arrive;
+    * ``none``     - written once per ``interval_ms``, fsync left to the OS.
+
+    Every ``snapshot_every`` records a snapshot of the whole state is written.
+    Where os.fork() exists a child process writes it from a copy-on-write image
+    of the state, so the server only pauses for the fork itself.  The
+    snapshot named N covers everything before log segment N, so recovery loads
+    the newest snapshot and replays only the segments from N on.
+    """
+
+    def __init__(self, directory, fsync="interval", interval_ms=50, snapshot_every=1_000_000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy: {fsync}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync
+        self.interval = interval_ms / 1000
+        self.snapshot_every = snapshot_every
+        self.since_snapshot = 0
+        self._pending = []
+        self._cond = threading.Condition()
+        self._appended = 0
+        self._durable = 0
+        self._closing = False
+        self._segment = None      # segment the writer thread is appending to
+        self._last_segment = None  # newest segment requested, rotations included
+        self._file = None
+        self._snapshotting = None
+        self._writer = None
+
+    # ----- recovery -----
+    def recover(self):
+        """Returns (request_counter, stack, history, records) from disk.
+
+        ``history`` is the HistoryStore saved in the newest snapshot (None without
+        one) and ``records`` the logged operations after it, to be replayed in
+        order.  Afterwards new records go to a fresh log segment.
+        """
+        counter, stack, history = 0, [], None
+        snapshots = _numbers(self.directory, "snapshot", ".pickle")
+        first_segment = 0
+        if snapshots:
+            first_segment = snapshots[-1]
+            with open(_snapshot_path(self.directory, first_segment), "rb") as f:
+                counter, stack, history = pickle.load(f)
+
+        records = []
+        segments = [n for n in _numbers(self.directory, "wal", ".log") if n >= first_segment]
+        for number in segments:
+            with open(_segment_path(self.directory, number), "rb") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # torn write at the end of a crashed segment
+        self._segment = self._last_segment = max(segments + [first_segment - 1, -1]) + 1
+        self._open_segment()
+        self._writer = threading.Thread(target=self._run, name="wal-writer", daemon=True)
+        self._writer.start()
+        return counter, stack, history, records
+
+    # ----- logging -----
+    def append(self, record):
+        """Queues one record and returns the ticket to pass to commit().
+
+        Call it in the same critical section as the state change it describes,
+        so the log order matches the order the changes were applied in.
+        """
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._cond:
+            self._pending.append(line)
+            self._appended += 1
+            ticket = self._appended
+            if self.fsync == "always":
+                self._cond.notify()
+        self.since_snapshot += 1
+        return ticket
+
+    def commit(self, ticket):
+        """Waits until the record behind ``ticket`` is durable (only for fsync=always)."""
+        if self.fsync != "always":
+            return
+        with self._cond:
+            while self._durable < ticket and not self._closing:
+                self._cond.wait()
+
+    def _open_segment(self):
+        self._file = open(_segment_path(self.directory, self._segment), "ab")
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            with self._cond:
+                if self.fsync == "always":
+                    if not self._pending and not self._closing:
+                        self._cond.wait()
+                else:
+                    # at most one write (and fsync) per interval, however busy the log is
+                    while not self._closing:
+                        remaining = last_flush + self.interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+                closing = self._closing
+                upto = self._appended
+            last_flush = time.monotonic()
+            self._write(batch)
+            with self._cond:
+                self._durable = upto
+                self._cond.notify_all()
+            if closing and not self._pending:
+                self._file.close()
+                return
+
+    def _write(self, batch):
+        lines = []
+        for item in batch:
+            if item is _ROTATE:
+                self._flush(lines)
+                lines = []
+                self._file.close()
+                self._segment += 1
+                self._open_segment()
+            else:
+                lines.append(item)
+        self._flush(lines)
+
+    def _flush(self, lines):
+        if not lines:
+            return
+        self._file.write("".join(lines).encode())
+        self._file.flush()
+        if self.fsync != "none":
+            os.fsync(self._file.fileno())
+
+    # ----- snapshots -----
+    def should_snapshot(self):
+        return self.since_snapshot >= self.snapshot_every and self._snapshotting is None
+
+    def snapshot(self, counter, stack, history):
+        """Snapshots the state and starts a new log segment.
+
+        The caller holds the state lock, so no record can slip in between the
+        state captured here and the segment switch.
+        """
+        with self._cond:
+            self._pending.append(_ROTATE)
+            self._cond.notify()
+        self._last_segment += 1
+        number = self._last_segment
+        self.since_snapshot = 0
+        if hasattr(os, "fork"):
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    self._write_snapshot(number, counter, stack, history)
+                    status = 0
+                finally:
+                    os._exit(status)
+            self._snapshotting = pid
+            threading.Thread(target=self._reap, args=(pid, number), daemon=True).start()
+        else:
+            self._write_snapshot(number, counter, stack, history)
+            self._prune(number)
+
+    def _write_snapshot(self, number, counter, stack, history):
+        path = _snapshot_path(self.directory, number)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump((counter, stack, history), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _reap(self, pid, number):
+        _, status = os.waitpid(pid, 0)
+        if status == 0 and os.path.exists(_snapshot_path(self.directory, number)):
+            self._prune(number)
+        self._snapshotting = None
+
+    def _prune(self, number):
+        """Removes the log segments and snapshots made obsolete by snapshot ``number``."""
+        for old in _numbers(self.directory, "wal", ".log"):
+            if old < number:
+                os.remove(_segment_path(self.directory, old))
+        for old in _numbers(self.directory, "snapshot", ".pickle"):
+            if old < number:
+                os.remove(_snapshot_path(self.directory, old))
+
+    def close(self):
+        if self._writer is None:
+            return
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._writer = None
@@ -0,0 +1,245 @@
+import ctypes
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client
+
+REUSE_PORT = hasattr(socket, "SO_REUSEPORT")
+_STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class CoordinatorError(RuntimeError):
+    """The coordinator raised while running a call; the message names the exception."""
+
+
+class SharedCounter:
+    """An integer in shared memory, counted up by forked processes under one lock."""
+
+    def __init__(self, value=0):
+        self._value = multiprocessing.RawValue(ctypes.c_longlong, value)
+        self._lock = multiprocessing.Lock()
+
+    def next(self):
+        with self._lock:
+            self._value.value += 1
+            return self._value.value
+
+    @property
+    def value(self):
+        return self._value.value
+
+    @value.setter
+    def value(self, value):
+        with self._lock:
+            self._value.value = value
+
+
+class SharedSettings:
+    """A few integers in shared memory, with a version bumped by every write so
+    readers can cheaply tell whether anything changed."""
+
+    def __init__(self, values):
+        self._array = multiprocessing.RawArray(ctypes.c_longlong, [0] + list(values))
+        self._lock = multiprocessing.Lock()
+
+    @property
+    def version(self):
+        return self._array[0]
+
+    def read(self):
+        """Returns (version, values)."""
+        with self._lock:
+            return self._array[0], self._array[1:]
+
+    def write(self, index, value):
+        with self._lock:
+            self._array[index + 1] = value
+            self._array[0] += 1
+
+
+def listen_socket(host, port, reuse_port=REUSE_PORT, backlog=128):
+    """A TCP socket bound to (host, port).
+
+    With ``reuse_port`` it is only bound: it reserves the port (and resolves
+    port 0) for workers that bind their own listening sockets with
+    SO_REUSEPORT, so the kernel spreads connections across them.  Otherwise it
+    is listening, and the workers accept from this one inherited socket.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if not reuse_port:
+        sock.listen(backlog)
+    return sock
+
+
+def serve_calls(listener, handle):
+    """Accepts connections from ``listener`` and answers their calls, a thread per connection.
+
+    Every message is a tuple passed to ``handle(*message)``; the reply is
+    (True, result), or (False, description) if it raised.
+    """
+    while True:
+        connection = listener.accept()
+        threading.Thread(target=_answer, args=(connection, handle), name="coordinator-call",
+                         daemon=True).start()
+
+
+def _answer(connection, handle):
+    with connection:
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = (True, handle(*message))
+            except Exception as exc:
+                reply = (False, f"{type(exc).__name__}: {exc}")
+            connection.send(reply)
+
+
+class CoordinatorClient:
+    """Calls into serve_calls() over one connection per thread, reconnecting after a failure."""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connect(self):
+        connection = self._local.connection = Client(self.address, authkey=self.authkey)
+        return connection
+
+    def call(self, *message):
+        connection = getattr(self._local, "connection", None)
+        try:
+            if connection is None:
+                connection = self._connect()
+            try:
+                connection.send(message)
+            except OSError:
+                # the coordinator was restarted since the last call and never saw
+                # this message, so sending it on a new connection is safe
+                connection.close()
+                connection = self._connect()
+                connection.send(message)
+            ok, result = connection.recv()
+        except (EOFError, OSError):
+            # the coordinator is gone (or restarting): the next call reconnects
+            self._local.connection = None
+            if connection is not None:
+                connection.close()
+            raise
+        if not ok:
+            raise CoordinatorError(result)
+        return result
+
+
+class _Stopping(Exception):
+    pass
+
+
+def _raise_stopping(signum, frame):
+    # a repeated stop signal stays pending until the shutdown it started is over
+    signal.pthread_sigmask(signal.SIG_BLOCK, _STOP_SIGNALS)
+    raise _Stopping
+
+
+class Supervisor:
+    """Forks child processes and forks them again when they exit.
+
+    The supervisor stays single-threaded, so forking never copies a lock held
+    by another thread.  A child that exits within ``min_uptime`` seconds of
+    starting is restarted after a pause, not in a tight loop.  On SIGTERM or
+    SIGINT the children are stopped in the reverse order they were added.
+    """
+
+    def __init__(self, min_uptime=1.0):
+        self.min_uptime = min_uptime
+        self.restarts = 0
+        self._specs = []       # (name, target), in start order
+        self._running = {}     # pid -> (index, started)
+
+    def add(self, name, target):
+        """Registers ``target()`` to run in a child process named ``name``."""
+        self._specs.append((name, target))
+
+    def _spawn(self, index):
+        name, target = self._specs[index]
+        # no stop signal between the fork and recording the pid
+        blocked = signal.pthread_sigmask(signal.SIG_BLOCK, _STOP_SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the supervisor, which stops us
+            else:
+                self._running[pid] = (index, time.monotonic())
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+        if pid == 0:
+            code = 1
+            try:
+                target()
+                code = 0
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+
+    def run(self):
+        """Starts every child and keeps them running until SIGTERM or SIGINT."""
+        previous = {sig: signal.signal(sig, _raise_stopping) for sig in _STOP_SIGNALS}
+        try:
+            for index in range(len(self._specs)):
+                self._spawn(index)
+            while True:
+                try:
+                    pid, status = os.waitpid(-1, 0)
+                except ChildProcessError:
+                    break
+                if pid not in self._running:
+                    continue
+                index, started = self._running.pop(pid)
+                name = self._specs[index][0]
+                print(f"{name} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}; restarting",
+                      file=sys.stderr)
+                if time.monotonic() - started < self.min_uptime:
+                    time.sleep(self.min_uptime)
+                self.restarts += 1
+                self._spawn(index)
+        except _Stopping:
+            pass
+        finally:
+            signal.pthread_sigmask(signal.SIG_BLOCK, _STOP_SIGNALS)
+            try:
+                self._shutdown()
+            finally:
+                # stop signals that came in meanwhile are discarded, not raised as _Stopping
+                for sig in previous:
+                    signal.signal(sig, signal.SIG_IGN)
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, _STOP_SIGNALS)
+                for sig, handler in previous.items():
+                    signal.signal(sig, handler)
+
+    def _shutdown(self):
+        """Stops the children, last added first; called with the stop signals blocked."""
+        for _, pid in sorted(((index, pid) for pid, (index, _) in self._running.items()), reverse=True):
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._running.clear()
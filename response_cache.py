@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Serialized responses of read-only endpoints, each valid for one state version.
+
+    An entry is the response bytes plus whatever the handler needs to log
+    about it, stored under a key (session, route, query) together with the
+    version of the state it was built from; get() only returns it while the
+    caller still sees that version, so a write invalidates it without any
+    bookkeeping.  Entries are evicted in LRU order beyond ``max_entries`` or
+    ``max_bytes`` of response bytes.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # key -> (version, data, extra)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """(data, extra) stored for ``key`` at ``version``, or None."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1], item[2]
+
+    def put(self, key, version, data, extra=None):
+        if self.max_entries <= 0 or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[1])
+            self._items[key] = (version, data, extra)
+            self.bytes += len(data)
+            while len(self._items) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted, _) = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
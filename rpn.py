@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+
+
+_TOKEN_TYPES = {int, str}
+
+
+class ProgramError(ValueError):
+    """The program cannot be compiled."""
+
+
+class Program:
+    """A compiled RPN program.
+
+    ``code`` is a tuple of instructions: ``(None, [ints])`` pushes a run of
+    values, ``(operation, arity)`` pops ``arity`` values (top first, as
+    GET /calculator/stack/operate does) and pushes the result.  ``needs`` is how
+    many values must already be on the stack for the program to run.
+    """
+
+    __slots__ = ("code", "needs", "steps")
+
+    def __init__(self, code, needs, steps):
+        self.code = code
+        self.needs = needs
+        self.steps = steps
+
+
+def compile_program(tokens, operations):
+    """Compiles a list of tokens (values to push and names from ``operations``, an
+    operations.Registry)."""
+    if not isinstance(tokens, (list, tuple)) or not tokens:
+        raise ProgramError("Error: program must be a non-empty list of values and operation names")
+    code = []
+    pushes = None
+    depth = needs = steps = 0
+    for token in tokens:
+        operation = operations.get(token) if isinstance(token, str) else None
+        if operation is not None:
+            name, arity = operation.name, operation.arity
+            if arity is None:
+                raise ProgramError(f"Error: operation {name} takes the whole stack and cannot be used in a program")
+            if depth < arity:
+                needs += arity - depth
+                depth = arity
+            depth -= arity - 1
+            code.append((name, arity))
+            pushes = None
+            steps += 1
+            continue
+        if isinstance(token, bool) or not isinstance(token, (int, str)):
+            raise ProgramError(f"Error: invalid program token: {token!r}")
+        try:
+            value = int(token)
+        except ValueError:
+            raise ProgramError(f"Error: unknown operation: {token}") from None
+        if pushes is None:
+            pushes = []
+            code.append((None, pushes))
+        pushes.append(value)
+        depth += 1
+    return Program(tuple(code), needs, steps)
+
+
+class ProgramCache:
+    """LRU of compiled programs keyed by their token tuple, so a repeated program
+    costs one hash lookup instead of a compile."""
+
+    def __init__(self, operations, max_entries=256):
+        self.operations = operations
+        self.max_entries = max_entries
+        self._programs = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tokens):
+        try:
+            key = tuple(tokens)
+            hash(key)
+        except TypeError:
+            raise ProgramError("Error: program must be a non-empty list of values and operation names") from None
+        if not set(map(type, key)) <= _TOKEN_TYPES:
+            # True == 1 and 1.0 == 1, so such a program would hit the entry of
+            # its int twin; compiling it reports the bad token instead
+            return compile_program(tokens, self.operations)
+        with self._lock:
+            program = self._programs.get(key)
+            if program is not None:
+                self._programs.move_to_end(key)
+                self.hits += 1
+                return program
+            self.misses += 1
+        program = compile_program(tokens, self.operations)
+        if self.max_entries > 0:
+            with self._lock:
+                self._programs[key] = program
+                while len(self._programs) > self.max_entries:
+                    self._programs.popitem(last=False)
+        return program
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._programs), "hits": self.hits, "misses": self.misses}
+
+
+def run_program(program, values, perform):
+    """Runs ``program`` on the list ``values`` (bottom to top) in place.
+
+    ``perform(name, args)`` returns (result, error, code) like
+    operations.Operation.apply, for the registered name of an operation and a
+    list of ints; names rather than Operations are kept in the code so a
+    Program can be pickled.  Returns (steps, error): ``steps`` holds
+    (operation, args, result) for every operation executed; on error ``values``
+    is left half-way and must be discarded by the caller.
+    """
+    steps = []
+    for name, operand in program.code:
+        if name is None:
+            values.extend(operand)
+            continue
+        args = values[-operand:][::-1]
+        del values[-operand:]
+        result, error, _ = perform(name, args)
+        if error:
+            return steps, error
+        if type(result) is not int:  # e.g. pow with a negative exponent; the stack only holds ints
+            return steps, f"Error while performing operation {name}: result {result!r} is not an integer"
+        values.append(result)
+        steps.append((name, args, result))
+    return steps, None
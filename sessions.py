@@ -0,0 +1,81 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from history_store import HistoryStore
+from stack_store import IntStack
+
+SESSION_NAME = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+
+
+class Session:
+    """One client's calculator state: its stack, its history and the lock guarding both.
+
+    ``journal(*record)``, if set, logs every change for persistence and returns
+    a commit ticket; sessions without one are kept in memory only.  ``version``
+    goes up with every change; it starts from the clock, so versions are not
+    reused by a later session of the same name or a restarted server.
+    """
+
+    __slots__ = ("name", "stack", "history", "lock", "journal", "version", "last_used")
+
+    def __init__(self, name, stack=None, history=None, lock=None, journal=None):
+        self.name = name
+        self.stack = IntStack() if stack is None else stack
+        self.history = HistoryStore() if history is None else history
+        self.lock = threading.RLock() if lock is None else lock
+        self.journal = journal
+        self.version = time.time_ns()
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """Named sessions, created on first use and evicted when idle.
+
+    ``default`` serves requests that name no session and is never evicted.  The
+    others are kept in LRU order: every get() evicts sessions idle for more
+    than ``ttl`` seconds and the least recently used ones beyond
+    ``max_sessions``.  The store lock only covers the lookup; requests then
+    serialize on their own session's lock.
+    """
+
+    def __init__(self, default, max_sessions=1024, ttl=1800.0):
+        self.default = default
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, name):
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                # new sessions keep as much history as the default one
+                session = Session(name, history=HistoryStore(self.default.history.max_entries))
+                self._sessions[name] = session
+                self.created += 1
+            else:
+                self._sessions.move_to_end(name)
+            session.last_used = now
+            self._evict(now)
+        return session
+
+    def _evict(self, now):
+        sessions = self._sessions
+        while sessions:
+            oldest = next(iter(sessions.values()))
+            if len(sessions) <= self.max_sessions and now - oldest.last_used <= self.ttl:
+                break
+            del sessions[oldest.name]
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "created": self.created, "evicted": self.evicted}
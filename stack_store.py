@@ -0,0 +1,126 @@
+from array import array
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+_BIG = _INT64_MIN  # slot marker: the value lives in IntStack._big
+
+
+class IntStack:
+    """Stack of integers stored as 8-byte machine ints in an ``array('q')``.
+
+    Values outside the int64 range (and -2**63 itself, used as the marker) keep
+    their slot in the array and are stored as Python ints in ``_big``, keyed by
+    position.  Push validates and converts every argument once; pop_many() and
+    truncate() cut the top of the array in one slice operation.  Not
+    thread-safe; callers hold the server's state lock.
+    """
+
+    __slots__ = ("_items", "_big", "_big_positions")
+
+    def __init__(self, values=()):
+        self._items = array("q")
+        self._big = {}
+        self._big_positions = []  # ascending, since values are only added on top
+        self.extend(list(values))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        """Bottom to top."""
+        big = self._big
+        for position, value in enumerate(self._items):
+            yield big[position] if value == _BIG else value
+
+    def __reduce__(self):
+        return IntStack, (list(self),)
+
+    @staticmethod
+    def convert(values):
+        """int() of every value, as operations.Registry.perform converts operands; raises ValueError on the first bad one."""
+        if set(map(type, values)) <= {int}:
+            return list(values)  # the common case: already plain ints
+        try:
+            return list(map(int, values))
+        except (TypeError, ValueError):
+            raise ValueError("Error: Arguments must be numeric (integers)") from None
+
+    def extend(self, values):
+        """Pushes the list ``values`` (already converted ints) in order, the last one ending on top."""
+        items = self._items
+        start = len(items)
+        try:
+            items.fromlist(values)  # all or nothing, unlike array.extend
+        except OverflowError:
+            for value in values:
+                self.append(value)
+            return
+        if _BIG in values:
+            # -2**63 fits the array but collides with the marker
+            for offset, value in enumerate(values):
+                if value == _BIG:
+                    self._store_big(start + offset, value)
+
+    def append(self, value):
+        if _INT64_MIN < value <= _INT64_MAX:
+            self._items.append(value)
+        else:
+            self._items.append(_BIG)
+            self._store_big(len(self._items) - 1, value)
+
+    def _store_big(self, position, value):
+        self._big[position] = value
+        self._big_positions.append(position)
+
+    def pop_many(self, count):
+        """Removes the top ``count`` values and returns them top first."""
+        start = len(self._items) - count
+        top = self._items[start:]
+        values = top.tolist()[::-1]
+        if self._big:
+            size = len(self._items)
+            values = [self._big[size - 1 - i] if value == _BIG else value
+                      for i, value in enumerate(values)]
+        self.truncate(count)
+        return values
+
+    def truncate(self, count):
+        """Drops the top ``count`` values."""
+        if count <= 0:
+            return
+        size = len(self._items) - count
+        del self._items[size:]
+        positions = self._big_positions
+        while positions and positions[-1] >= size:
+            del self._big[positions.pop()]
+
+    def top(self):
+        """All values, top first (what the DEBUG stack dump prints)."""
+        if self._big:
+            return list(self)[::-1]
+        return self._items.tolist()[::-1]
+
+    def chunks(self, size):
+        """Yields the values top first, ``size`` at a time."""
+        items, big = self._items, self._big
+        for end in range(len(items), 0, -size):
+            values = items[max(end - size, 0):end].tolist()[::-1]
+            if big:
+                values = [big[end - 1 - i] if value == _BIG else value for i, value in enumerate(values)]
+            yield values
+
+    def copy(self):
+        """A copy costing one memcpy of the array (plus the out-of-range values)."""
+        clone = IntStack()
+        clone._items = self._items[:]
+        clone._big = dict(self._big)
+        clone._big_positions = list(self._big_positions)
+        return clone
+
+    def clear(self):
+        self.truncate(len(self._items))
+
+    def nbytes(self):
+        """Approximate memory held by the values."""
+        return self._items.itemsize * self._items.buffer_info()[1] + sum(
+            value.__sizeof__() for value in self._big.values())
@@ -70,5 +70,21 @@ echo.
 curl -X GET "http://localhost:8496/calculator/history?flavor=STACK"
 echo.
 
+:: 18 - POST /independent/batch
+curl -X POST "http://localhost:8496/calculator/independent/batch" -H "Content-Type: application/json" -d "[{\"operation\": \"plus\", \"arguments\": [1, 2]}, {\"operation\": \"divide\", \"arguments\": [1, 0]}]"
+echo.
+
+:: 19 - POST /stack/program
+curl -X POST "http://localhost:8496/calculator/stack/program" -H "Content-Type: application/json" -d "{\"program\": [2, 3, \"plus\", 4, \"times\"], \"steps\": true}"
+echo.
+
+:: 20 - GET /metrics
+curl -X GET "http://localhost:8496/metrics"
+echo.
+
+:: 21 - GET /stack/arguments
+curl -X GET "http://localhost:8496/calculator/stack/arguments"
+echo.
+
 echo Tests finished.
 pause